@@ -1,18 +1,82 @@
+from bisect import bisect_left, bisect_right
 from dataclasses import dataclass
-from typing import Optional
+from typing import TYPE_CHECKING, Callable, Optional
 import os.path
 import re
 
 from buffer.line_array import LineArray, Line
+from buffer.marks import Mark, MarkIndex
 from buffer.cursor import Cursor, CursorMoveDirection
+from buffer.folds import FoldIndex, RowMap
+from buffer.search_plan import SearchPlan, find_lines_with, plan_search
+from buffer.word_index import WordIndex, get_words
+from utils.clipboard import Clipboard
+from utils.columns import index_to_column
 from utils.point import Point
 from utils.prompts import InputPrompt, ConfirmationPrompt
+from utils.scheduler import Scheduler
+
+#The diff, the file loader, the filtered view, the transforms and the compression libraries aren't needed to show the first frame, they are
+#imported when they are first used.
+if TYPE_CHECKING:
+    from buffer.diff import DiffIndex
+    from buffer.file_loader import FileLoader
+    from buffer.line_filter import LineFilter
+    from buffer.transforms import TransformTask
+    from utils.compression import Compression
 
 
 @dataclass
 class BufferFileInfo:
     filename: str = None
     dirty: bool = False
+    #The compression of the file, "None" if it isn't compressed.
+    compression: Optional["Compression"] = None
+
+
+#Stores the result of the last literal search, it's used to narrow down the next search when the query is extended. "version" is the buffer
+#version the search was performed on, the results are only valid as long as it doesn't change.
+@dataclass
+class SearchState:
+    literal: str
+    matched_lines: list[int]
+    version: int
+
+
+#The selection goes from "anchor" to the main cursor. A block selection is the rectangle with both positions as its corners.
+@dataclass
+class Selection:
+    anchor: Point
+    block: bool = False
+
+
+#Stores the state of the last completion, it's used to cycle through the candidates when completing again at the same place. "position" and
+#"version" are the position of the main cursor and the buffer version after the completion was inserted.
+@dataclass
+class CompletionState:
+    prefix: str
+    candidates: list[str]
+    index: int
+    position: Point
+    version: int
+
+
+#Maximum amount of positions in the jump list, the oldest are dropped.
+JUMP_LIST_SIZE = 100
+
+#Amount of lines above and below the cursor that are looked at to rank the completion candidates by distance.
+COMPLETION_WINDOW = 100
+
+
+#Describes the result of an edit performed at a cursor. "cursor" is the new position of the cursor, the text that was at "anchor" and after it on
+#the same line is now at "moved_to", both positions are taken before and after the edit respectively. "line_change" is the amount of lines
+#that were added or removed.
+@dataclass(slots = True)
+class EditResult:
+    cursor: Point
+    anchor: Point
+    moved_to: Point
+    line_change: int
 
 
 class Buffer:
@@ -20,82 +84,222 @@ class Buffer:
         self._buffer_file_info = BufferFileInfo()
 
         self._l_array = LineArray()
-        self._cursor = Cursor(self._l_array, 0, 0)
+        #The folded regions, they are kept up to date as lines are added and removed.
+        self._folds = FoldIndex()
+        self._l_array.larray_add_listener(self._folds)
+        #Converts between lines and the rows they are shown in, using the folds or the filtered view.
+        self._rows = RowMap(self._folds)
+        self._cursor = Cursor(self._l_array, 0, 0, self._rows)
+
+        #The identifiers in the buffer, used for word completion.
+        self._word_index = WordIndex()
+        self._l_array.larray_add_listener(self._word_index)
+        self._completion: Optional[CompletionState] = None
+
+        #Incremented every time the buffer is modified, used to know if cached information about the buffer is still valid.
+        self._version = 0
+        self._last_search: Optional[SearchState] = None
+        #The lines of the buffer joined with line breaks, searched for the literals of regexes. Only kept until the buffer is modified.
+        self._search_text: Optional[str] = None
+        #The end position of each match of the last search, only valid until the buffer is modified.
+        self._matches: list[Point] = []
+
+        #The differences with the file on disk, only kept while the diff view is enabled.
+        self._diff: Optional["DiffIndex"] = None
+        #Loads the file in the background, only set while a file is loading.
+        self._loader: Optional["FileLoader"] = None
+        #The transform running in the background, only set while one is running.
+        self._transform: Optional["TransformTask"] = None
+
+        #The bookmarked lines, and the named marks along with the positions in the jump list. They move along with the text.
+        self._bookmarks = MarkIndex(self._l_array)
+        self._anchors = MarkIndex(self._l_array)
+        self._named_marks: dict[str, Mark] = {}
+        #Positions the main cursor jumped from, oldest first. "_jump_index" is the position the next jump back goes to plus one, it's past
+        #the end of the list when the cursor isn't in the middle of going back through it.
+        self._jumps: list[Mark] = []
+        self._jump_index = 0
+
+        #Cursors other than the main one, kept sorted by position. Edits and movements are applied at every cursor, the view follows the main
+        #one.
+        self._extra_cursors: list[Cursor] = []
+        self._selection: Optional[Selection] = None
 
 #################
 #Buffer handling
 #################
-    #Adds a character to the buffer on the cursors current position.
-    def add_str(self, string: str) -> None:
-        self._buffer_modified_handler()
+    #All edits are applied at every cursor, see "_apply_edit".
 
-        #Insert the word in the line array and move the cursor accordingly.
-        self._l_array.larray_insert(self._cursor.get_position(), string)
-        self._cursor.move_to_point(Point(self._cursor.get_position().x + len(string), self._cursor.get_position().y))
+    #Adds a character to the buffer on the cursors current position, replacing the selection if there is one.
+    def add_str(self, string: str) -> None:
+        self._delete_selection()
+        self._apply_edit(lambda pos: self._insert_at(pos, string))
 
     #Add the necessary amount of spaces to move the cursor the next tabulation line.
     def add_tab(self, tab_width: int) -> None:
-        self._buffer_modified_handler()
-
-        cursor_pos = self._cursor.get_position()
-        #Get the amount of required spaces.
-        diff = tab_width - (cursor_pos.x % tab_width)
-
-        self._l_array.larray_insert(cursor_pos, " " * diff)
-        self._cursor.move_to_point(Point(cursor_pos.x + diff, cursor_pos.y)) 
+        self._delete_selection()
+        #Get the amount of required spaces, it depends on the position of each cursor.
+        self._apply_edit(lambda pos: self._insert_at(pos, " " * (tab_width -
+            index_to_column(self._l_array.larray_get_data(pos.y), pos.x) % tab_width)))
 
     #Performs a line-break at the cursor's position.
     def perform_linebreak(self) -> None:
-        self._buffer_modified_handler()
+        self._delete_selection()
+        splits: list[tuple[Point, str]] = []
+        self._apply_edit(lambda pos: self._linebreak_at(pos, splits), lambda: self._l_array.larray_split_lines(splits[::-1]))
 
-        cursor_pos = self._cursor.get_position()
-        #Store what's right of the cursor and delete it from the current line.
-        right_of_cursor = self._l_array.larray_get_line(cursor_pos.y).data[cursor_pos.x:]
-        self._l_array.larray_delete_slice(cursor_pos.y, cursor_pos.x, len(self._l_array.larray_get_line(cursor_pos.y).data))
+    #Removes the character at the back of the cursor, or the selection if there is one.
+    def remove_char_back(self) -> None:
+        if self._delete_selection():
+            self._buffer_modified_handler()
+        else:
+            self._apply_edit(self._remove_back_at)
 
-        #Create a new line with what was right of the cursor. First we get how many spaces there are at the beginning of the line, the same
-        #amount is added to the new line.
-        tab_amount = len(self._l_array.larray_get_line(cursor_pos.y).data) - len(self._l_array.larray_get_line(cursor_pos.y).data.lstrip(" "))
+    #Removes the character in front of the cursor, or the selection if there is one.
+    def remove_char_front(self) -> None:
+        if self._delete_selection():
+            self._buffer_modified_handler()
+        else:
+            self._apply_edit(self._remove_front_at)
 
-        self._l_array.larray_add_newline(cursor_pos.y + 1)
-        self._l_array.larray_insert(Point(0, cursor_pos.y + 1), f"{' ' * tab_amount}{right_of_cursor}")
+    #Replaces the text between each pair of positions with the given text, which can span several lines. The positions are taken before any
+    #of the edits are made, the edits are applied from the bottom up so they don't move each other. Returns "False" without changing anything
+    #if a position is outside of the buffer or the ranges overlap. The extra cursors and the selection are removed.
+    def replace_ranges(self, edits: list[tuple[Point, Point, str]]) -> bool:
+        edits = sorted(edits, key = lambda edit: (edit[0].y, edit[0].x))
+        previous_end = Point(0, 0)
 
-        #Update the cursor's position.
-        self._cursor.move_to_point(Point(tab_amount, cursor_pos.y + 1))
+        for (start, end, _) in edits:
+            if (start.y, start.x) < (previous_end.y, previous_end.x) or (end.y, end.x) < (start.y, start.x) or \
+                end.y >= self._l_array.larray_get_length() or start.x < 0 or end.x > len(self._l_array.larray_get_data(end.y)) or \
+                start.x > len(self._l_array.larray_get_data(start.y)):
+                return False
+
+            previous_end = end
 
-    #Removes the character at the back of the cursor.
-    def remove_char_back(self) -> None:
         self._buffer_modified_handler()
-        
-        cursor_pos = self._cursor.get_position()
 
-        if cursor_pos.x != 0:
-            self._l_array.larray_delete_pos(cursor_pos)
-            self._cursor.move(CursorMoveDirection.LEFT)
-        else:
-            #If we are at the end of the line whatever remains should be appended to the line on top.
-            if cursor_pos.y > 0:
-                insert_x = len(self._l_array.larray_get_line(cursor_pos.y - 1).data)
-                self._l_array.larray_insert(Point(insert_x, cursor_pos.y - 1), self._l_array.larray_get_line(cursor_pos.y).data)
+        for (start, end, text) in reversed(edits):
+            lines = text.split("\n")
+            left = self._l_array.larray_get_data(start.y)[:start.x]
+            right = self._l_array.larray_get_data(end.y)[end.x:]
 
-                self._l_array.larray_delete_line(cursor_pos.y)
+            self._l_array.larray_delete_lines(start.y + 1, end.y + 1)
 
-                #Move the cursor to the appropriate position.
-                self._cursor.move_to_point(Point(insert_x, cursor_pos.y - 1))
+            if len(lines) == 1:
+                self._l_array.larray_set_line(start.y, f"{left}{lines[0]}{right}")
+            else:
+                self._l_array.larray_set_line(start.y, f"{left}{lines[0]}")
+                self._l_array.larray_insert_lines(start.y + 1, [*lines[1:-1], f"{lines[-1]}{right}"])
 
-    #Removes the character in front of the cursor.
-    def remove_char_front(self) -> None:
+        #The main cursor is kept where it was, as long as that position still exists.
+        self.set_cursor_pos(self._cursor.get_position())
+
+        return True
+
+    #Applies an edit at the position of every cursor in a single pass, the buffer modification is only handled once. The cursors are processed
+    #from the bottom of the buffer to the top, that way an edit never moves the text before it and the positions of the cursors still to be
+    #processed remain valid. Afterwards, the cursors are placed from the top down, keeping track of how the edits above moved the text in a
+    #running offset, so placing them doesn't depend on how many cursors came before. Edits that only collect what has to be changed, so it can
+    #be done at once, are completed by "apply" before the cursors are placed.
+    def _apply_edit(self, edit: Callable[[Point], Optional[EditResult]], apply: Optional[Callable[[], None]] = None) -> None:
         self._buffer_modified_handler()
 
-        cursor_pos = self._cursor.get_position()
+        results = []
+
+        for cursor in reversed(self._get_sorted_cursors()):
+            pos = cursor.get_position()
+            result = edit(pos)
+
+            #Nothing was changed, this is equivalent to an edit that moves no text.
+            if result == None:
+                result = EditResult(pos, pos, pos, 0)
+
+            results.append((cursor, result))
+
+        if apply != None:
+            apply()
+
+        #Where the text of the line the last edit was on ended up, and how much it was moved horizontally. Later lines were only moved by the
+        #amount of lines added or removed.
+        edit_line = -1
+        current_line = 0
+        x_offset = 0
+        line_offset = 0
+
+        for (cursor, result) in reversed(results):
+            #Move the cursor by how the edits above it moved the text.
+            if result.cursor.y == edit_line:
+                cursor.move_to_point(Point(result.cursor.x + x_offset, current_line))
+            else:
+                cursor.move_to_point(Point(result.cursor.x, result.cursor.y + line_offset))
+
+            #Add the movement caused by this edit. The text after the anchor was moved, if it's now where the text moved by the previous edits
+            #is, both movements add up.
+            if result.moved_to.y == edit_line:
+                x_offset += result.moved_to.x - result.anchor.x
+            else:
+                x_offset = result.moved_to.x - result.anchor.x
+                current_line = result.moved_to.y + line_offset
+
+            edit_line = result.anchor.y
+            line_offset += result.line_change
+
+        #Edits can bring cursors to the same position.
+        self._merge_cursors()
+
+    #Inserts the given string at the position.
+    def _insert_at(self, pos: Point, string: str) -> EditResult:
+        self._l_array.larray_insert(pos, string)
+        new_pos = Point(pos.x + len(string), pos.y)
+
+        return EditResult(new_pos, pos, new_pos, 0)
+
+    #Adds a line-break at the position to the splits, they are made together once every cursor has been processed. With many cursors, each
+    #split inserting its own line would move the rest of the array every time.
+    def _linebreak_at(self, pos: Point, splits: list[tuple[Point, str]]) -> EditResult:
+        #What's right of the cursor is moved to a new line. First we get how many spaces there are at the beginning of the line, the same
+        #amount is added to the new line. The splits below haven't been made yet, but they don't change the text left of the cursor.
+        left_of_cursor = self._l_array.larray_get_data(pos.y)[:pos.x]
+        tab_amount = len(left_of_cursor) - len(left_of_cursor.lstrip(" "))
+
+        splits.append((pos, " " * tab_amount))
+
+        new_pos = Point(tab_amount, pos.y + 1)
+
+        return EditResult(new_pos, pos, new_pos, 1)
+
+    #Removes the character at the back of the position.
+    def _remove_back_at(self, pos: Point) -> Optional[EditResult]:
+        if pos.x != 0:
+            self._l_array.larray_delete_pos(pos)
+            new_pos = Point(pos.x - 1, pos.y)
 
+            return EditResult(new_pos, pos, new_pos, 0)
+        #If we are at the start of the line whatever remains should be appended to the line on top.
+        elif pos.y > 0:
+            insert_x = len(self._l_array.larray_get_data(pos.y - 1))
+            self._l_array.larray_join_lines(pos.y - 1)
+            new_pos = Point(insert_x, pos.y - 1)
+
+            return EditResult(new_pos, pos, new_pos, -1)
+
+        return None
+
+    #Removes the character in front of the position.
+    def _remove_front_at(self, pos: Point) -> Optional[EditResult]:
         #If we are on the end of the line add the line below to it, assuming it exists.
-        if cursor_pos.x == len(self._l_array.larray_get_line(cursor_pos.y).data):
-            if cursor_pos.y < self._l_array.larray_get_length() - 1:
-                self._l_array.larray_insert(cursor_pos, self._l_array.larray_get_line(cursor_pos.y + 1).data)
-                self._l_array.larray_delete_line(cursor_pos.y + 1)
+        if pos.x == len(self._l_array.larray_get_data(pos.y)):
+            if pos.y < self._l_array.larray_get_length() - 1:
+                self._l_array.larray_join_lines(pos.y)
+
+                return EditResult(pos, Point(0, pos.y + 1), pos, -1)
+
+            return None
         else:
-            self._l_array.larray_delete_pos(Point(cursor_pos.x + 1, cursor_pos.y))
+            self._l_array.larray_delete_pos(Point(pos.x + 1, pos.y))
+
+            return EditResult(pos, Point(pos.x + 1, pos.y), pos, 0)
 
     #Searches the buffer for strings that match the given regex and highlights them, returns the amount of matches found, this can be zero.
     #If the given regex is invalid returns "None".
@@ -105,22 +309,81 @@ class Buffer:
         
         #Check if the given regex is valid.
         try:
-            complied_re = re.compile(regex)
-        except:
+            plan = plan_search(regex)
+        except re.error:
             return None
 
         match_count = 0
+        matched_lines = []
+        self._matches = []
+
+        #Go through each candidate line and iterate through all the matches highlighting and counting them.
+        for a in self._get_search_candidates(plan):
+            matches = plan.find_all(self._l_array.larray_get_data(a))
 
-        #Go through each line in the buffer and iterate through all the matches highlighting and counting them.
-        for a in range(self._l_array.larray_get_length()):
-            matches = complied_re.finditer(self._l_array.larray_get_line(a).data)
+            for (start, end) in matches:
+                self._l_array.larray_highlight_slice(a, start, end)
+                self._matches.append(Point(end, a))
 
-            for match in matches:
-                self._l_array.larray_highlight_slice(a, match.start(), match.end())
-                match_count += 1
+            if matches:
+                match_count += len(matches)
+                matched_lines.append(a)
+
+        #Only the results of literal searches can be used to narrow down later searches.
+        if plan.is_literal:
+            self._last_search = SearchState(plan.literal, matched_lines, self._version)
+        else:
+            self._last_search = None
 
         return match_count
 
+    #Returns the matches of the regex as (line, start, end) tuples, at most "max_matches" of them, without highlighting them. Returns "None" if
+    #the regex isn't valid.
+    def find_regex(self, regex: str, max_matches: int) -> Optional[list[tuple[int, int, int]]]:
+        try:
+            plan = plan_search(regex)
+        except re.error:
+            return None
+
+        matches = []
+
+        for y in self._get_search_candidates(plan):
+            for (start, end) in plan.find_all(self._l_array.larray_get_data(y)):
+                matches.append((y, start, end))
+
+                if len(matches) == max_matches:
+                    return matches
+
+        return matches
+
+    #Returns the indexes of the lines that could match the regex. If the regex requires a literal that contains the previous literal search,
+    #and the buffer wasn't modified since, only the lines that matched before can match. Otherwise the lines with the literal are found by
+    #searching the whole buffer as a single string, and if there is no literal every line has to be checked.
+    def _get_search_candidates(self, plan: SearchPlan) -> range | list[int]:
+        if plan.literal == None:
+            return range(self._l_array.larray_get_length())
+
+        last = self._last_search
+
+        if last != None and last.version == self._version and last.literal in plan.literal:
+            return last.matched_lines
+
+        return find_lines_with(self._get_search_text(), plan.literal)
+
+    #Invalidates the cached information about the buffer. The joined text used by searches is as large as the buffer, so it's released right
+    #away instead of being kept until the next search.
+    def _increment_version(self) -> None:
+        self._version += 1
+        self._search_text = None
+
+    #Returns the lines of the buffer joined with line breaks. It's kept until the buffer is modified, so searching again while a query is
+    #being typed doesn't join the lines again.
+    def _get_search_text(self) -> str:
+        if self._search_text == None:
+            self._search_text = "\n".join(self._l_array.larray_get_lines(0, self._l_array.larray_get_length()))
+
+        return self._search_text
+
     #Replaces the with the specified string. Returns how many replacements were performed, can be zero. #If the given regex is invalid returns
     #"None".
     def replace_regex(self, regex: str, replace_with: str) -> Optional[int]:
@@ -128,43 +391,135 @@ class Buffer:
 
         #Check if the given regex is valid.
         try:
-            complied_re = re.compile(regex)
-        except:
+            plan = plan_search(regex)
+        except re.error:
             return None
 
-        #Go through each line in the buffer and replaces the matching regex, counts how many replacements were performed.
-        for a in range(self._l_array.larray_get_length()):
-            (updated_line, line_substitutions) = re.subn(regex, replace_with, self._l_array.larray_get_line(a).data) 
-            self._l_array.larray_set_line(a, updated_line)
-            total_substitutions += line_substitutions
+        #Go through each line that can match and replaces the matching regex, counts how many replacements were performed.
+        for a in self._get_search_candidates(plan):
+            (updated_line, line_substitutions) = plan.regex.subn(replace_with, self._l_array.larray_get_data(a)) 
+
+            #Only the lines that changed are set, setting a line notifies the listeners of the line array.
+            if line_substitutions:
+                self._l_array.larray_set_line(a, updated_line)
+                total_substitutions += line_substitutions
 
         #If any substitutions were performed the buffer has been modified.
         if total_substitutions:
             self._buffer_modified_handler()
+            #The positions of the extra cursors and of the selection could no longer exist.
+            self.clear_extra_cursors()
+            self.clear_selection()
 
         return total_substitutions
 
     #To be called each time the buffer is modified.
     def _buffer_modified_handler(self) -> None:
         self._set_dirty(True)
+        self._increment_version()
         #Matched strings could have been modified.
         self._l_array.larray_highlight_clear()
+        self._matches = []
 
 #################
 #Cursor handling
 #################
 
-    #Moves the cursor in the specified position.
+    #Moves the cursors in the specified position.
     def move_cursor(self, dir: CursorMoveDirection) -> None:
-        self._cursor.move(dir)
+        self.clear_selection()
+
+        for cursor in self._get_sorted_cursors():
+            cursor.move(dir)
 
-    #Moves the cursor to the end of the current line.
+        self._merge_cursors()
+
+    #Moves the cursors to the end of their current line.
     def move_cursor_end(self) -> None:
-        self._cursor.move_to_point(Point(len(self._l_array.larray_get_line(self._cursor.get_y()).data), self._cursor.get_y()))
+        self.clear_selection()
+
+        for cursor in self._get_sorted_cursors():
+            cursor.move_to_point(Point(len(self._l_array.larray_get_data(cursor.get_y())), cursor.get_y()))
+
+        self._merge_cursors()
 
-    #Moves the cursor to the start of the current line.
+    #Moves the cursors to the start of their current line.
     def move_cursor_start(self) -> None:
-        self._cursor.move_to_point(Point(0, self._cursor.get_y()))
+        self.clear_selection()
+
+        for cursor in self._get_sorted_cursors():
+            cursor.move_to_point(Point(0, cursor.get_y()))
+
+        self._merge_cursors()
+
+    #Adds a cursor on the line above the topmost cursor, or below the bottommost one. Adding several in a row creates a column of cursors.
+    def add_cursor_vertical(self, dir: CursorMoveDirection) -> None:
+        cursors = self._get_sorted_cursors()
+        origin = cursors[0] if dir == CursorMoveDirection.UP else cursors[-1]
+
+        new_cursor = Cursor(self._l_array, origin.get_x(), origin.get_y(), self._rows)
+        new_cursor.move(dir)
+
+        #There is no line in that direction.
+        if new_cursor.get_y() == origin.get_y():
+            return
+
+        self.clear_selection()
+        self._extra_cursors.append(new_cursor)
+        self._merge_cursors()
+
+    #Places a cursor at the end of every match of the last search, the main cursor goes to the first one. Returns the amount of cursors.
+    def add_cursors_at_matches(self) -> int:
+        if not self._matches:
+            return 0
+
+        self.clear_selection()
+        self._push_jump()
+        self._rows.reveal(self._matches[0].y)
+        self._cursor.move_to_point(self._matches[0])
+        #The matches are found in order, so the cursors are already sorted.
+        self._extra_cursors = [Cursor(self._l_array, pos.x, pos.y, self._rows) for pos in self._matches[1:]]
+        self._merge_cursors()
+
+        return len(self._extra_cursors) + 1
+
+    #Removes every cursor except the main one.
+    def clear_extra_cursors(self) -> None:
+        self._extra_cursors = []
+
+    #Returns the amount of cursors, including the main one.
+    def get_cursor_count(self) -> int:
+        return len(self._extra_cursors) + 1
+
+    #Returns the positions of the extra cursors between lines "start" and "end", "end" not included.
+    def get_extra_cursor_positions(self, start: int, end: int) -> list[Point]:
+        #The extra cursors are sorted, so the ones in range are found with a binary search.
+        first = bisect_left(self._extra_cursors, start, key = lambda cursor: cursor.get_y())
+        last = bisect_left(self._extra_cursors, end, key = lambda cursor: cursor.get_y())
+
+        return [cursor.get_position() for cursor in self._extra_cursors[first:last]]
+
+    #Returns all the cursors, including the main one, sorted by position.
+    def _get_sorted_cursors(self) -> list[Cursor]:
+        if not self._extra_cursors:
+            return [self._cursor]
+
+        return sorted([self._cursor, *self._extra_cursors], key = lambda cursor: (cursor.get_y(), cursor.get_x()))
+
+    #Removes the cursors that share a position with another one, keeping the main cursor, and sorts the extra cursors.
+    def _merge_cursors(self) -> None:
+        if not self._extra_cursors:
+            return
+
+        seen = {self._cursor.get_position()}
+        merged = []
+
+        for cursor in sorted(self._extra_cursors, key = lambda cursor: (cursor.get_y(), cursor.get_x())):
+            if cursor.get_position() not in seen:
+                seen.add(cursor.get_position())
+                merged.append(cursor)
+
+        self._extra_cursors = merged
 
     #Gets the length of the line array associated with the buffer, this is done to maintain "_l_array" private.
     def get_length(self) -> int:
@@ -174,10 +529,597 @@ class Buffer:
     def get_line(self, index: int) -> Line:
         return self._l_array.larray_get_line(index)
 
+    #Returns the text of the lines between "start" and "end", "end" not included, the range is kept in the bounds of the buffer. The strings
+    #are shared with the buffer, so it's cheap even for many lines.
+    def get_lines(self, start: int, end: int) -> list[str]:
+        length = self._l_array.larray_get_length()
+        start = min(max(start, 0), length)
+
+        return self._l_array.larray_get_lines(start, min(max(end, start), length))
+
     #Gets the position of the cursor associated with the buffer, this is done to maintain "_cursor" private.
     def get_cursor_pos(self) -> Point:
         return self._cursor.get_position()
 
+    #Moves the main cursor to the given position, or as close to it as possible if it's outside of the buffer. The other cursors and the
+    #selection are removed.
+    def set_cursor_pos(self, pos: Point) -> None:
+        y = min(pos.y, self._l_array.larray_get_length() - 1)
+
+        self.clear_extra_cursors()
+        self.clear_selection()
+        self._rows.reveal(y)
+        self._cursor.move_to_point(Point(min(pos.x, len(self._l_array.larray_get_data(y))), y))
+
+#################
+#Fold handling
+#################
+
+    #Unfolds the fold at the main cursor's line if there is one, otherwise folds the block it starts. Returns "False" if there was nothing to
+    #fold.
+    def toggle_fold(self) -> bool:
+        #Folds aren't shown in the filtered view.
+        if self._rows.line_filter != None:
+            return False
+        if self._folds.unfold(self._cursor.get_y()):
+            return True
+
+        #The extra cursors could end up hidden.
+        self.clear_extra_cursors()
+
+        return self._folds.fold(self._l_array, self._cursor.get_y())
+
+    #Folds every top level block, the cursors are moved out of the folded lines.
+    def fold_all(self) -> None:
+        if self._rows.line_filter != None:
+            return
+
+        self._folds.fold_all(self._l_array)
+        self.clear_extra_cursors()
+        self._cursor.move_to_point(Point(0, self._folds.row_to_line(self._folds.line_to_row(self._cursor.get_y()))))
+
+    def unfold_all(self) -> None:
+        self._folds.unfold_all()
+
+    #Returns whether the given line is the header of a fold.
+    def is_fold_header(self, index: int) -> bool:
+        return self._folds.is_header(index)
+
+    #Returns the row the given line is shown in, rows skip the lines hidden by folds or left out of the filtered view.
+    def line_to_row(self, index: int) -> int:
+        return self._rows.line_to_row(index)
+
+    #Returns the line shown in the given row.
+    def row_to_line(self, row: int) -> int:
+        return self._rows.row_to_line(row)
+
+    #Returns the amount of rows needed to show the buffer.
+    def get_row_count(self) -> int:
+        return self._rows.get_row_count(self._l_array.larray_get_length())
+
+#################
+#Filter handling
+#################
+
+    #Enables the filtered view, showing only the lines that match the regex, or disables it if it's enabled, the regex isn't needed then.
+    #Returns a message for the user, or "None" if the regex isn't valid. The lines are found in the background, "on_progress" is called with a
+    #message for the user as they are. The line of the main cursor is always shown.
+    def toggle_filter(self, regex: Optional[str], scheduler: Scheduler, on_progress: Callable[[str], None]) -> Optional[str]:
+        if self._rows.line_filter != None:
+            self._close_filter()
+
+            return "Filtered view disabled"
+
+        from buffer.line_filter import LineFilter
+
+        try:
+            compiled_regex = plan_search(regex).regex
+        except re.error:
+            return None
+
+        def filter_progress(fraction: float, count: int) -> None:
+            on_progress(f"{'Filtering... ' if fraction < 1 else ''}{count} line{'' if count == 1 else 's'} shown for \"{regex}\"")
+
+        self.clear_extra_cursors()
+        self.clear_selection()
+        self._rows.line_filter = LineFilter(self._l_array, compiled_regex, scheduler, filter_progress)
+        self._rows.reveal(self._cursor.get_y())
+
+        return "Filtering..."
+
+    def is_filter_enabled(self) -> bool:
+        return self._rows.line_filter != None
+
+    def _close_filter(self) -> None:
+        self._rows.line_filter.close()
+        self._rows.line_filter = None
+
+#################
+#Diff handling
+#################
+
+    #Enables the diff view, comparing the buffer with its file, or disables it if it's enabled. Returns a message for the user.
+    def toggle_diff(self) -> str:
+        if self._diff != None:
+            self._l_array.larray_remove_listener(self._diff)
+            self._diff = None
+
+            return "Diff view disabled"
+
+        if self._buffer_file_info.filename == None:
+            return "The buffer has no file to compare with"
+
+        from buffer.diff import DiffIndex
+        from utils.compression import READ_ERRORS, detect_compression, open_text_reader
+
+        try:
+            with open(self._buffer_file_info.filename, "rb") as raw_file, \
+                open_text_reader(raw_file, detect_compression(raw_file)) as file:
+                #Lines are read the same way they are when loading, so an unmodified buffer has no differences.
+                disk_lines = [line.rstrip() for line in file.readlines()]
+        except READ_ERRORS:
+            return "The given file path cannot be read"
+
+        #An empty file is loaded as a single empty line.
+        self._diff = DiffIndex(disk_lines if disk_lines else [""], self._l_array.larray_get_lines(0, self._l_array.larray_get_length()))
+        self._l_array.larray_add_listener(self._diff)
+        change_count = len(self._diff.get_hunks())
+
+        return f"{'No' if change_count == 0 else change_count} change{'' if change_count == 1 else 's'} from the file on disk"
+
+    def is_diff_enabled(self) -> bool:
+        return self._diff != None
+
+    #Returns the diff markers of the lines between "start" and "end", "end" not included, indexed by line.
+    def get_diff_markers(self, start: int, end: int) -> dict[int, str]:
+        if self._diff == None:
+            return {}
+
+        return self._diff.get_markers(start, end)
+
+    #Moves the main cursor to the next change from the file on disk, returns whether there was one.
+    def move_to_next_change(self) -> bool:
+        return self._move_to_change(None if self._diff == None else self._diff.get_next_change(self._cursor.get_y()))
+
+    #Moves the main cursor to the previous change from the file on disk, returns whether there was one.
+    def move_to_previous_change(self) -> bool:
+        return self._move_to_change(None if self._diff == None else self._diff.get_previous_change(self._cursor.get_y()))
+
+    def _move_to_change(self, line: Optional[int]) -> bool:
+        if line == None:
+            return False
+
+        self._push_jump()
+        self.set_cursor_pos(Point(0, line))
+
+        return True
+
+#################
+#Transform handling
+#################
+
+    #Starts transforming every line of the buffer with the given command, see "parse_transform" for the commands. Returns a message for the
+    #user. The transform runs in the background on the lines as they are now, "on_progress" is called with a message for the user as it runs
+    #and when it's done. The transformed lines replace the buffer in a single modification, unless the buffer was modified in the meantime.
+    def transform_lines(self, command: str, scheduler: Scheduler, on_progress: Callable[[str], None]) -> str:
+        from buffer.transforms import parse_transform, run_transform
+
+        #Transforming a partially loaded file would cut it short.
+        if self._loader != None:
+            return "The file is still loading"
+        if self._transform != None:
+            return "A transform is already running, press Escape to cancel it"
+
+        parsed = parse_transform(command)
+
+        if isinstance(parsed, str):
+            return parsed
+
+        (name, transform) = parsed
+        length = self._l_array.larray_get_length()
+        version = self._version
+
+        def transform_progress(fraction: float) -> None:
+            on_progress(f"{name}... {fraction:.0%}, press Escape to cancel")
+
+        def transform_done(result: list[str] | str) -> None:
+            self._transform = None
+
+            if isinstance(result, str):
+                on_progress(result)
+            #Applying the result would undo the changes made while it ran.
+            elif self._version != version:
+                on_progress(f"The buffer was modified, the result of \"{command}\" was discarded")
+            else:
+                self._replace_lines(result)
+                on_progress(f"{name}: {length} line{'' if length == 1 else 's'} became {len(result)}")
+
+        #Only the references to the lines are copied, the strings are shared with the buffer.
+        self._transform = run_transform(self._l_array.larray_get_lines(0, length), transform, scheduler, transform_progress, transform_done)
+
+        return f"{name}..."
+
+    #Cancels the running transform, the buffer is left as it was. Returns whether there was one.
+    def cancel_transform(self) -> bool:
+        if self._transform == None:
+            return False
+
+        self._transform.cancel()
+        self._transform = None
+
+        return True
+
+    #Replaces every line of the buffer in a single modification. The line array is reset before the lines are inserted, so the listeners
+    #rebuild their indexes once instead of removing every old line.
+    def _replace_lines(self, lines: list[str]) -> None:
+        cursor_pos = self._cursor.get_position()
+
+        self._buffer_modified_handler()
+        #The lines are rearranged, there is no telling where the marks should go, so they are dropped as when a file is opened.
+        self._clear_marks()
+        self._l_array.larray_initialize()
+
+        #The line array starts with an empty line, the lines are inserted before it.
+        if lines:
+            self._l_array.larray_insert_lines(0, lines)
+            self._l_array.larray_delete_line(len(lines))
+
+        self.set_cursor_pos(cursor_pos)
+
+#################
+#Mark handling
+#################
+
+    #Bookmarks the main cursor's line, or removes its bookmark if it has one. Returns whether the line is now bookmarked.
+    def toggle_bookmark(self) -> bool:
+        y = self._cursor.get_y()
+        bookmarks = self._bookmarks.get_marks(y, y + 1)
+
+        for bookmark in bookmarks:
+            self._bookmarks.remove(bookmark)
+
+        if bookmarks:
+            return False
+
+        self._bookmarks.add(Point(0, y))
+
+        return True
+
+    #Moves the main cursor to the next bookmarked line, going back to the first one after the last. Returns whether there was one.
+    def move_to_next_bookmark(self) -> bool:
+        if len(self._bookmarks) == 0:
+            return False
+
+        y = self._cursor.get_y()
+        bookmark = self._bookmarks.get_next(Point(len(self._l_array.larray_get_data(y)), y)) or self._bookmarks.get_next(Point(-1, 0))
+
+        self._push_jump()
+        self.set_cursor_pos(Point(0, self._bookmarks.get_position(bookmark).y))
+
+        return True
+
+    #Returns the bookmarked lines between "start" and "end", "end" not included.
+    def get_bookmarked_lines(self, start: int, end: int) -> set[int]:
+        return {self._bookmarks.get_position(bookmark).y for bookmark in self._bookmarks.get_marks(start, end)}
+
+    #Sets the mark with the given name at the main cursor, replacing the previous one with that name.
+    def set_mark(self, name: str) -> None:
+        if name in self._named_marks:
+            self._anchors.remove(self._named_marks[name])
+
+        self._named_marks[name] = self._anchors.add(self._cursor.get_position())
+
+    #Moves the main cursor to the mark with the given name, returns whether there is one.
+    def move_to_mark(self, name: str) -> bool:
+        if name not in self._named_marks:
+            return False
+
+        self._push_jump()
+        self.set_cursor_pos(self._anchors.get_position(self._named_marks[name]))
+
+        return True
+
+    #Moves the main cursor back to where it was before the last jump, returns whether there was one.
+    def jump_back(self) -> bool:
+        if self._jump_index == 0:
+            return False
+
+        #The position being left is stored, so a jump forward comes back to it.
+        if self._jump_index == len(self._jumps):
+            self._push_jump()
+            self._jump_index -= 1
+
+        self._jump_index -= 1
+        self.set_cursor_pos(self._anchors.get_position(self._jumps[self._jump_index]))
+
+        return True
+
+    #Undoes a jump back, returns whether there was one.
+    def jump_forward(self) -> bool:
+        if self._jump_index >= len(self._jumps) - 1:
+            return False
+
+        self._jump_index += 1
+        self.set_cursor_pos(self._anchors.get_position(self._jumps[self._jump_index]))
+
+        return True
+
+    #Stores the main cursor's position in the jump list before a jump. Jumping from the middle of the list drops the positions after it.
+    def _push_jump(self) -> None:
+        for jump in self._jumps[self._jump_index:]:
+            self._anchors.remove(jump)
+
+        del self._jumps[self._jump_index:]
+        self._jumps.append(self._anchors.add(self._cursor.get_position()))
+
+        if len(self._jumps) > JUMP_LIST_SIZE:
+            self._anchors.remove(self._jumps.pop(0))
+
+        self._jump_index = len(self._jumps)
+
+    #Removes every mark, bookmark and jump, they belong to the text they were set in.
+    def _clear_marks(self) -> None:
+        self._bookmarks.clear()
+        self._anchors.clear()
+        self._named_marks = {}
+        self._jumps = []
+        self._jump_index = 0
+
+#################
+#Selection handling
+#################
+
+    #Moves the main cursor in the specified direction extending the selection, a selection is started if there isn't one.
+    def select_move(self, dir: CursorMoveDirection) -> None:
+        self._start_selection()
+        self._cursor.move(dir)
+
+    #Switches the selection between a normal and a block selection, a selection is started if there isn't one.
+    def toggle_block_selection(self) -> None:
+        self._start_selection()
+        self._selection.block = not self._selection.block
+
+    #Selects the whole buffer.
+    def select_all(self) -> None:
+        self.clear_extra_cursors()
+        last_line = self._l_array.larray_get_length() - 1
+
+        self._selection = Selection(Point(0, 0))
+        self._rows.reveal(last_line)
+        self._cursor.move_to_point(Point(len(self._l_array.larray_get_data(last_line)), last_line))
+
+    #Extends the selection up to the end of the next match of the last search. Returns whether there was a match after the cursor.
+    def select_to_next_match(self) -> bool:
+        cursor_pos = self._cursor.get_position()
+        index = bisect_right(self._matches, (cursor_pos.y, cursor_pos.x), key = lambda pos: (pos.y, pos.x))
+
+        if index == len(self._matches):
+            return False
+
+        self._start_selection()
+        self._rows.reveal(self._matches[index].y)
+        self._cursor.move_to_point(self._matches[index])
+
+        return True
+
+    def clear_selection(self) -> None:
+        self._selection = None
+
+    #Returns the start and end of the selection, in order, or "None" if nothing is selected. For a block selection these are the top left and
+    #bottom right corners of the rectangle.
+    def get_selection(self) -> Optional[tuple[Point, Point]]:
+        if self._selection == None:
+            return None
+
+        anchor = self._selection.anchor
+        cursor_pos = self._cursor.get_position()
+
+        if self._selection.block:
+            return (Point(min(anchor.x, cursor_pos.x), min(anchor.y, cursor_pos.y)), Point(max(anchor.x, cursor_pos.x),
+                max(anchor.y, cursor_pos.y)))
+        elif (anchor.y, anchor.x) <= (cursor_pos.y, cursor_pos.x):
+            return (anchor, cursor_pos)
+        else:
+            return (cursor_pos, anchor)
+
+    #Returns the selected columns of the line at the specified index as a (start, end) pair, "end" not included, or "None" if no part of the
+    #line is selected.
+    def get_selected_columns(self, index: int) -> Optional[tuple[int, int]]:
+        selection = self.get_selection()
+
+        if selection == None or not (selection[0].y <= index <= selection[1].y):
+            return None
+
+        (start, end) = selection
+
+        if self._selection.block:
+            return (start.x, end.x)
+
+        return (start.x if index == start.y else 0, end.x if index == end.y else len(self._l_array.larray_get_data(index)))
+
+    #Copies the selection to the clipboard, returns whether there was a selection. Only the first and last lines of a selection can be
+    #partially selected, the lines in between are copied as references to the strings in the line array.
+    def copy_selection(self, clipboard: Clipboard) -> bool:
+        selection = self.get_selection()
+
+        if selection == None:
+            return False
+
+        (start, end) = selection
+
+        if self._selection.block:
+            lines = [line[start.x:end.x] for line in self._l_array.larray_get_lines(start.y, end.y + 1)]
+        elif start.y == end.y:
+            lines = [self._l_array.larray_get_data(start.y)[start.x:end.x]]
+        else:
+            lines = self._l_array.larray_get_lines(start.y, end.y + 1)
+            lines[0] = lines[0][start.x:]
+            lines[-1] = lines[-1][:end.x]
+
+        clipboard.set_content(lines, self._selection.block)
+
+        return True
+
+    #Copies the selection to the clipboard and deletes it, returns whether there was a selection.
+    def cut_selection(self, clipboard: Clipboard) -> bool:
+        if not self.copy_selection(clipboard):
+            return False
+
+        self._delete_selection()
+        self._buffer_modified_handler()
+
+        return True
+
+    #Pastes the content of the clipboard at the main cursor, replacing the selection if there is one. The lines between the first and the last
+    #one are inserted with a single operation on the line array, sharing the strings with the clipboard.
+    def paste(self, clipboard: Clipboard) -> None:
+        if clipboard.is_empty():
+            return
+
+        self._delete_selection()
+        self._buffer_modified_handler()
+        self.clear_extra_cursors()
+
+        cursor_pos = self._cursor.get_position()
+        lines = clipboard.lines
+
+        if clipboard.block:
+            #Each line is inserted at the same column on consecutive lines, lines are added at the end of the buffer and short lines are
+            #padded as needed.
+            for (i, text) in enumerate(lines):
+                y = cursor_pos.y + i
+
+                if y == self._l_array.larray_get_length():
+                    self._l_array.larray_add_newline(y)
+
+                line_len = len(self._l_array.larray_get_data(y))
+
+                if line_len < cursor_pos.x:
+                    self._l_array.larray_insert(Point(line_len, y), " " * (cursor_pos.x - line_len))
+
+                self._l_array.larray_insert(Point(cursor_pos.x, y), text)
+
+            self._cursor.move_to_point(Point(cursor_pos.x + len(lines[-1]), cursor_pos.y + len(lines) - 1))
+        else:
+            line_data = self._l_array.larray_get_data(cursor_pos.y)
+            (left, right) = (line_data[:cursor_pos.x], line_data[cursor_pos.x:])
+
+            if len(lines) == 1:
+                self._l_array.larray_set_line(cursor_pos.y, f"{left}{lines[0]}{right}")
+                self._cursor.move_to_point(Point(cursor_pos.x + len(lines[0]), cursor_pos.y))
+            else:
+                self._l_array.larray_set_line(cursor_pos.y, f"{left}{lines[0]}")
+                self._l_array.larray_insert_lines(cursor_pos.y + 1, [*lines[1:-1], f"{lines[-1]}{right}"])
+                self._cursor.move_to_point(Point(len(lines[-1]), cursor_pos.y + len(lines) - 1))
+
+    #Starts a selection at the main cursor if there isn't one, only the main cursor can have a selection.
+    def _start_selection(self) -> None:
+        if self._selection == None:
+            self.clear_extra_cursors()
+            self._selection = Selection(self._cursor.get_position())
+
+    #Deletes the selected text and places the cursor at its start, returns whether there was a selection. The lines between the first and the
+    #last one are deleted with a single operation on the line array.
+    def _delete_selection(self) -> bool:
+        selection = self.get_selection()
+
+        if selection == None:
+            return False
+
+        (start, end) = selection
+
+        if self._selection.block:
+            for y in range(start.y, end.y + 1):
+                line_len = len(self._l_array.larray_get_data(y))
+
+                if start.x < line_len:
+                    self._l_array.larray_delete_slice(y, start.x, min(end.x, line_len))
+
+            self._cursor.move_to_point(Point(min(start.x, len(self._l_array.larray_get_data(start.y))), start.y))
+        else:
+            first_line = self._l_array.larray_get_data(start.y)
+            last_line = self._l_array.larray_get_data(end.y)
+
+            self._l_array.larray_set_line(start.y, f"{first_line[:start.x]}{last_line[end.x:]}")
+            self._l_array.larray_delete_lines(start.y + 1, end.y + 1)
+            self._cursor.move_to_point(start)
+
+        self._selection = None
+
+        return True
+
+#################
+#Completion handling
+#################
+
+    #Completes the word left of the main cursor with the best ranked word in the buffer that starts with it, at every cursor. Completing again
+    #without moving the cursor or editing cycles through the other candidates. Returns the inserted word, or "None" if there is nothing to
+    #complete.
+    def complete_word(self) -> Optional[str]:
+        cursor_pos = self._cursor.get_position()
+        state = self._completion
+
+        if state != None and state.position == cursor_pos and state.version == self._version:
+            #Remove the previously inserted completion.
+            for _ in range(len(state.candidates[state.index]) - len(state.prefix)):
+                self.remove_char_back()
+
+            state.index = (state.index + 1) % len(state.candidates)
+        else:
+            prefix = self._get_word_prefix(cursor_pos)
+            candidates = self._rank_candidates(prefix, cursor_pos.y) if prefix != "" else []
+
+            if not candidates:
+                return None
+
+            state = CompletionState(prefix, candidates, 0, cursor_pos, self._version)
+
+        word = state.candidates[state.index]
+        self.add_str(word[len(state.prefix):])
+
+        state.position = self._cursor.get_position()
+        state.version = self._version
+        self._completion = state
+
+        return word
+
+    #Returns the part of the identifier that ends at the given position.
+    def _get_word_prefix(self, pos: Point) -> str:
+        line_data = self._l_array.larray_get_data(pos.y)
+        start = pos.x
+
+        while start > 0 and (line_data[start - 1].isalnum() or line_data[start - 1] == "_"):
+            start -= 1
+
+        #Identifiers can't start with a digit.
+        while start < pos.x and line_data[start].isdigit():
+            start += 1
+
+        return line_data[start:pos.x]
+
+    #Returns the words that start with the given prefix, sorted so that the closest ones to the specified line come first and, after them,
+    #the most frequent ones. Only the lines near the cursor that contain the prefix are tokenized.
+    def _rank_candidates(self, prefix: str, line: int) -> list[str]:
+        candidates = self._word_index.get_candidates(prefix)
+
+        if not candidates:
+            return []
+
+        distances = {}
+        remaining = set(candidates)
+
+        for distance in range(COMPLETION_WINDOW + 1):
+            for y in {line - distance, line + distance}:
+                if 0 <= y < self._l_array.larray_get_length() and prefix in self._l_array.larray_get_data(y):
+                    for word in remaining.intersection(get_words(self._l_array.larray_get_data(y))):
+                        distances[word] = distance
+                        remaining.discard(word)
+
+            if not remaining:
+                break
+
+        return sorted(candidates, key = lambda word: (distances.get(word, COMPLETION_WINDOW + 1), -self._word_index.get_count(word), word))
+
 #################
 #Highlight handling
 #################
@@ -206,8 +1148,15 @@ class Buffer:
     def _set_dirty(self, dirty: bool) -> None:
         self._buffer_file_info.dirty = dirty
 
-    #Saves the buffer, if necessary handles getting the filename.
+    #Saves the buffer, if necessary handles getting the filename. Compressed files are compressed again with the same format and level, new
+    #files are compressed according to their extension.
     def save_buffer(self, input_prompt: InputPrompt, confirmation_prompt: ConfirmationPrompt, line_ending: str = "\n") -> Optional[str]:
+        #Saving a partially loaded file would cut it short.
+        if self._loader != None:
+            return "The file is still loading"
+
+        from utils.compression import get_compression_for_filename
+
         #Check if the file already has a filename, if not get it.
         if self._buffer_file_info.filename == None:
             filename = input_prompt.get_input("Save file: ")
@@ -219,34 +1168,58 @@ class Buffer:
             elif os.path.isfile(filename):
                 if confirmation_prompt.get_confirmation(f"The file \"{filename}\" already exists, overwrite?") != True:
                     return None
+
+            compression = get_compression_for_filename(filename)
         else:
             filename = self._buffer_file_info.filename
-                
+            compression = self._buffer_file_info.compression
+
+        return self._write_file(filename, compression, line_ending)
+
+    #Saves the buffer to its file, returns a message for the user or "None" if the buffer has no file.
+    def save_file(self, line_ending: str = "\n") -> Optional[str]:
+        if self._buffer_file_info.filename == None:
+            return None
+        #Saving a partially loaded file would cut it short.
+        if self._loader != None:
+            return "The file is still loading"
+
+        return self._write_file(self._buffer_file_info.filename, self._buffer_file_info.compression, line_ending)
+
+    #Writes the buffer to the file, compressing it if needed, and makes it the buffer's file. Returns a message for the user.
+    def _write_file(self, filename: str, compression: Optional["Compression"], line_ending: str) -> str:
+        from utils.compression import open_text_writer
+
         try:
-            file = open(filename, "w")
+            file = open_text_writer(filename, compression)
         #In case an error occurred.
         except OSError:
             return "The given file path cannot be accessed"
         else:
             try:
-                #We read each line in the buffer and write it to the file, adding the corresponding line ending.
-                for y in range(0, self._l_array.larray_get_length()):
-                    file.write(f"{self._l_array.larray_get_line(y).data}{line_ending}")
-                    
-                file.close()
+                #We read each line in the buffer and write it to the file, adding the corresponding line ending. The writer compresses the lines
+                #as they are written.
+                with file:
+                    for y in range(0, self._l_array.larray_get_length()):
+                        file.write(f"{self._l_array.larray_get_data(y)}{line_ending}")
             except:
                return "The given file path could not be written to"
             else:
                 #If the file could be written set the filename.
                 self._buffer_file_info.filename = filename
+                self._buffer_file_info.compression = compression
                 #The file was saved, therefore the buffer is no longer different from the file.
                 self._buffer_file_info.dirty = False
 
+                if self._diff != None:
+                    self._diff.mark_saved()
+
                 #No errors occurred, return the number of bytes written to disk.
                 return f"{os.path.getsize(filename)} bytes written to disk"
 
-    #Loads a file to the buffer, handles getting the filename.
-    def load_buffer(self, input_prompt: InputPrompt, confirmation_prompt: ConfirmationPrompt) -> Optional[str]:
+    #Starts loading a file to the buffer, handles getting the filename. See "open_file".
+    def load_buffer(self, input_prompt: InputPrompt, confirmation_prompt: ConfirmationPrompt, scheduler: Scheduler,
+        on_progress: Callable[[str], None]) -> Optional[str]:
         #If there are unsaved changes ask the user what to do with them.
         if self._buffer_file_info.dirty:
             if confirmation_prompt.get_confirmation("Discard unsaved file?") != True:
@@ -258,34 +1231,74 @@ class Buffer:
         if filename == None:
             return None
 
+        return self.open_file(filename, scheduler, on_progress)
+
+    #Starts loading the file to the buffer, returns a message for the user. Compressed files are detected by their magic number and
+    #decompressed as they are read. The file is read on a worker thread and its lines are added by a task in the scheduler, "on_progress" is
+    #called with a message for the user as it loads and when it's done. "on_loaded" is called once the file is fully loaded.
+    def open_file(self, filename: str, scheduler: Scheduler, on_progress: Callable[[str], None],
+        on_loaded: Optional[Callable[[], None]] = None) -> str:
+        from buffer.file_loader import FileLoader
+        from utils.compression import detect_compression
+
         try:
-            file = open(filename, "r")
+            file = open(filename, "rb")
         #In case an error occurred.
         except OSError:
             return "The given file path cannot be accessed"
-        else:
-            self._l_array.larray_initialize()
 
-            try:
-                index = 0
+        try:
+            compression = detect_compression(file)
+        except OSError:
+            #The file is only kept open once it's handed to the loader.
+            file.close()
 
-                #We read each line in the file and write it to the buffer.
-                for line in file.readlines():
-                    self._l_array.larray_insert(Point(0, index), line.rstrip())
-                    self._l_array.larray_add_newline(index + 1)
+            return "The given file path cannot be accessed"
 
-                    index += 1
+        if self._loader != None:
+            self._loader.cancel()
 
-                #An additional empty line is added by the loop, this is the most elegant way of eliminating it.
-                self._l_array.larray_delete_line(index)
-                file.close()
-            except:
-                return "The given file path cannot be read"
-            else:
-                #If the file could be loaded set the filename.
-                self._buffer_file_info.filename = filename
-                #A file was just loaded, therefore the buffer is no longer different from the file.
-                self._buffer_file_info.dirty = False
+        #The diff view compares with the previous file, and the filtered view would scan it.
+        if self._diff != None:
+            self.toggle_diff()
+        if self._rows.line_filter != None:
+            self._close_filter()
 
-                #No errors occurred, return the number of bytes written to disk.
-                return f"{os.path.getsize(filename)} bytes loaded from disk"
\ No newline at end of file
+        self._l_array.larray_initialize()
+        self._cursor.move_to_point(Point(0, 0))
+        self.clear_extra_cursors()
+        self.clear_selection()
+        #The whole buffer is replaced.
+        self._increment_version()
+        self._clear_marks()
+        #The filename is only set once the file is loaded.
+        self._buffer_file_info = BufferFileInfo()
+
+        def load_progress(fraction: float) -> None:
+            #Cached search results don't include the new lines.
+            self._increment_version()
+            on_progress(f"Loading \"{filename}\"... {fraction:.0%}")
+
+        def load_done(error: Optional[str]) -> None:
+            self._loader = None
+            self._increment_version()
+            #The trailing empty line may have been removed from under the cursor.
+            self._cursor.move_to_point(Point(0, min(self._cursor.get_y(), self._l_array.larray_get_length() - 1)))
+            self.clear_extra_cursors()
+
+            if error != None:
+                on_progress(error)
+                return
+
+            #If the file could be loaded set the filename.
+            self._buffer_file_info.filename = filename
+            self._buffer_file_info.compression = compression
+
+            on_progress(f"{os.path.getsize(filename)} bytes loaded from disk")
+
+            if on_loaded != None:
+                on_loaded()
+
+        self._loader = FileLoader(self._l_array, file, compression, scheduler, load_progress, load_done)
+
+        return f"Loading \"{filename}\"..."
\ No newline at end of file
@@ -1,7 +1,9 @@
 from enum import Enum, auto
 from typing import Optional
 
+from buffer.folds import RowMap
 from buffer.line_array import LineArray, Line
+from utils.columns import column_to_index, get_line_width, index_to_column
 from utils.point import Point
 
 
@@ -12,10 +14,15 @@ class CursorMoveDirection(Enum):
     DOWN = auto()
 
 class Cursor:
-    def __init__(self, l_array: LineArray, xPos: int, yPos: int) -> None:
+    __slots__ = ("_l_array", "_rows", "_position", "_desired_x_position")
+
+    #If "rows" is given, moving between lines skips the lines that aren't shown in a row, the ones hidden by folds or left out of the filtered
+    #view.
+    def __init__(self, l_array: LineArray, xPos: int, yPos: int, rows: Optional[RowMap] = None) -> None:
         self._l_array = l_array
+        self._rows = rows
         self._position = Point(xPos, yPos)
-        #This variables stores the X position the cursor would like to be in, it's used when moving vertically from one line to another line 
+        #This variables stores the column the cursor would like to be in, it's used when moving vertically from one line to another line 
         #and the line we are moving to isn't long enough for the cursor to have it's previous horizontal position. When not in use it's set to
         #"-1" to allow for easy and always false comparisons using "max".
         self._desired_x_position = -1
@@ -37,23 +44,25 @@ class Cursor:
                 self._desired_x_position = -1
 
                 if self._position.x > 0:
-                    self._position.x -= 1
+                    self._position = Point(self._position.x - 1, self._position.y)
                 else:
-                    if self._position.y > 0:
-                        self._position.y -= 1
+                    previous_y = self._get_line_by_rows(-1)
+
+                    if previous_y != self._position.y:
                         #If we move the the previous line the cursor should be at it's end.
-                        self._position.x = len(self._l_array.larray_get_line(self._position.y).data)
+                        self._position = Point(len(self._l_array.larray_get_data(previous_y)), previous_y)
 
             case CursorMoveDirection.RIGHT:
                 #If we move horizontally the desired X position is reset.
                 self._desired_x_position = -1
 
-                if self._position.x < len(self._l_array.larray_get_line(self._position.y).data):
-                    self._position.x += 1
+                if self._position.x < len(self._l_array.larray_get_data(self._position.y)):
+                    self._position = Point(self._position.x + 1, self._position.y)
                 else:
-                    if (self._position.y < self._l_array.larray_get_length() - 1):
-                        self._position.y += 1
-                        self._position.x = 0
+                    next_y = self._get_line_by_rows(1)
+
+                    if next_y != self._position.y:
+                        self._position = Point(0, next_y)
 
             case CursorMoveDirection.UP:
                 self._change_y_pos(-1)
@@ -61,37 +70,45 @@ class Cursor:
             case CursorMoveDirection.DOWN:
                 self._change_y_pos(1)
 
-    #Changes the Y position of the cursor, the change can be both positive or negative.
+    #Changes the Y position of the cursor, the change can be both positive or negative. The cursor keeps its column rather than its index,
+    #so it stays in place visually when the lines have tabs or wide characters.
     def _change_y_pos(self, change: int) -> None:
-        new_y = self._position.y + change
-
-        #Ensure the Y position remains in bounds.
-        if new_y < 0:
-            new_y = 0
-        elif new_y > self._l_array.larray_get_length() - 1:
-            new_y = self._l_array.larray_get_length() - 1
-
-        self._position.y = new_y
-
-        new_line_len = len(self._l_array.larray_get_line(new_y).data)
-        new_x = max(self._position.x, self._desired_x_position)
+        new_y = self._get_line_by_rows(change)
+        new_line = self._l_array.larray_get_data(new_y)
+        column = max(index_to_column(self._l_array.larray_get_data(self._position.y), self._position.x), self._desired_x_position)
 
-        #If new_x is shorter than the line, we set the cursors X position normally. Otherwise we set the cursor to the end of the line and set
+        #If the column is inside the line, we set the cursors X position normally. Otherwise we set the cursor to the end of the line and set
         #the desired position.
-        if new_x < new_line_len:
+        if column < get_line_width(new_line):
             self._desired_x_position = -1
-            self._position.x = new_x
+            self._position = Point(column_to_index(new_line, column), new_y)
         else:
             #We only set the desired position if it's not already set.
             if self._desired_x_position == -1:
-                self._desired_x_position = self._position.x
+                self._desired_x_position = column
+
+            self._position = Point(len(new_line), new_y)
+
+    #Returns the line that is "change" rows away from the cursor, a row is a line that isn't hidden. The result is kept in the bounds of the
+    #buffer.
+    def _get_line_by_rows(self, change: int) -> int:
+        if self._rows == None:
+            return min(max(self._position.y + change, 0), self._l_array.larray_get_length() - 1)
+
+        row_count = self._rows.get_row_count(self._l_array.larray_get_length())
+
+        #A filtered view can be empty, there is no row to move to.
+        if row_count == 0:
+            return self._position.y
+
+        row = min(max(self._rows.line_to_row(self._position.y) + change, 0), row_count - 1)
 
-            self._position.x = new_line_len
+        return self._rows.row_to_line(row)
 
     #Moves the cursor to the given position, if it's valid.
     def move_to_point(self, pos: Point) -> None:
         if 0 <= pos.y <= self._l_array.larray_get_length():
-            if 0 <= pos.x <= len(self._l_array.larray_get_line(pos.y).data):
+            if 0 <= pos.x <= len(self._l_array.larray_get_data(pos.y)):
                 self._desired_x_position = -1
 
                 self._position = pos
\ No newline at end of file
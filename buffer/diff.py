@@ -0,0 +1,305 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from buffer.line_array import LineArrayListener
+
+
+#If the two sides of a diff differ by more than this amount of lines the region is reported as a single change, this bounds the time the
+#Myers algorithm can take.
+MAX_EDIT_DISTANCE = 500
+
+
+#A changed region, the lines of the buffer between "buffer_start" and "buffer_end" replace the lines of the file between "disk_start" and
+#"disk_end", the ends are not included. A region with no buffer lines is a deletion, one with no file lines is an addition.
+@dataclass(slots = True)
+class Hunk:
+    buffer_start: int
+    buffer_end: int
+    disk_start: int
+    disk_end: int
+
+
+#Kind of change of each line, used for the markers in the gutter.
+class DiffMarker:
+    ADDED = "+"
+    MODIFIED = "~"
+    #Lines were deleted right before the marked line.
+    DELETED = "-"
+
+
+#Returns the hunks needed to turn the "old" sequence into the "new" one, the positions are relative to the start of both sequences. The
+#common prefix and suffix are trimmed before running the Myers diff on what's left.
+def diff_sequences(old: array, new: array) -> list[Hunk]:
+    start = _match_length(old, new)
+    suffix = _match_length(old[:start - 1:-1] if start else old[::-1], new[:start - 1:-1] if start else new[::-1])
+    old_end = len(old) - suffix
+    new_end = len(new) - suffix
+
+    if start == old_end and start == new_end:
+        return []
+    if start == old_end or start == new_end:
+        return [Hunk(start, new_end, start, old_end)]
+
+    hunks = _myers(old[start:old_end], new[start:new_end])
+
+    if hunks == None:
+        return [Hunk(start, new_end, start, old_end)]
+
+    for hunk in hunks:
+        hunk.buffer_start += start
+        hunk.buffer_end += start
+        hunk.disk_start += start
+        hunk.disk_end += start
+
+    return hunks
+
+
+#Returns the amount of matching lines in both sequences starting at "old_start" and "new_start". Slices of growing size are compared first,
+#comparing slices doesn't go through the interpreter for each line.
+def _match_length(old: array, new: array, old_start: int = 0, new_start: int = 0) -> int:
+    length = min(len(old) - old_start, len(new) - new_start)
+    matched = 0
+    step = 16
+
+    while matched < length:
+        step = min(step, length - matched)
+        old_index = old_start + matched
+        new_index = new_start + matched
+
+        if old[old_index:old_index + step] == new[new_index:new_index + step]:
+            matched += step
+            step *= 2
+        elif step > 16:
+            step = 16
+        else:
+            while old[old_start + matched] == new[new_start + matched]:
+                matched += 1
+            break
+
+    return matched
+
+
+#Returns the hunks between "old" and "new" using the Myers algorithm, or "None" if they differ by more than "MAX_EDIT_DISTANCE" lines.
+def _myers(old: array, new: array) -> Optional[list[Hunk]]:
+    old_len = len(old)
+    new_len = len(new)
+    offset = min(old_len + new_len, MAX_EDIT_DISTANCE) + 1
+    #For each diagonal the furthest position in "old" reached, the diagonals are shifted by "offset" to be used as indexes.
+    furthest = [0] * (2 * offset + 1)
+    trace = []
+
+    for distance in range(0, offset):
+        trace.append(furthest[:])
+
+        for diagonal in range(-distance, distance + 1, 2):
+            if diagonal == -distance or (diagonal != distance and furthest[offset + diagonal - 1] < furthest[offset + diagonal + 1]):
+                x = furthest[offset + diagonal + 1]
+            else:
+                x = furthest[offset + diagonal - 1] + 1
+
+            y = x - diagonal
+
+            x += _match_length(old, new, x, y)
+            y = x - diagonal
+
+            furthest[offset + diagonal] = x
+
+            if x >= old_len and y >= new_len:
+                return _backtrack(trace, offset, old_len, new_len)
+
+    return None
+
+
+#Follows the trace of the Myers algorithm back from the end, each step is a single insertion or deletion, consecutive ones are grouped into
+#hunks.
+def _backtrack(trace: list[list[int]], offset: int, x: int, y: int) -> list[Hunk]:
+    hunks = []
+
+    for distance in range(len(trace) - 1, 0, -1):
+        furthest = trace[distance]
+        diagonal = x - y
+
+        if diagonal == -distance or (diagonal != distance and furthest[offset + diagonal - 1] < furthest[offset + diagonal + 1]):
+            previous_diagonal = diagonal + 1
+        else:
+            previous_diagonal = diagonal - 1
+
+        previous_x = furthest[offset + previous_diagonal]
+        previous_y = previous_x - previous_diagonal
+
+        #Skip the matching lines that follow the step.
+        matched = max(min(x - previous_x, y - previous_y), 0)
+        x -= matched
+        y -= matched
+
+        if x == previous_x:
+            _add_to_hunks(hunks, Hunk(previous_y, y, x, x))
+        else:
+            _add_to_hunks(hunks, Hunk(y, y, previous_x, x))
+
+        (x, y) = (previous_x, previous_y)
+
+    hunks.reverse()
+
+    return hunks
+
+
+#Adds a change to the hunks, which are being built back to front, merging it with the first one if they are contiguous.
+def _add_to_hunks(hunks: list[Hunk], hunk: Hunk) -> None:
+    if hunks and hunk.buffer_end == hunks[-1].buffer_start and hunk.disk_end == hunks[-1].disk_start:
+        hunks[-1].buffer_start = hunk.buffer_start
+        hunks[-1].disk_start = hunk.disk_start
+    else:
+        hunks.append(hunk)
+
+
+#Returns the hashes of the given lines, lines are compared through their hashes.
+def hash_lines(lines: list[str]) -> array:
+    return array("q", map(hash, lines))
+
+
+#Keeps the differences between a line array and the lines of a file. The lines of both are hashed, the hashes of the line array are kept up to
+#date as it changes and the range of lines changed since the last diff is tracked. Only that range, widened to the hunks it touches, is diffed
+#again when the hunks are needed, the lines around it are known to be matched.
+class DiffIndex(LineArrayListener):
+    def __init__(self, disk_lines: list[str], buffer_lines: list[str]) -> None:
+        self._disk = hash_lines(disk_lines)
+        self._buffer = hash_lines(buffer_lines)
+        #Sorted by position, the hunks after a change are moved along with the lines until they are diffed again.
+        self._hunks = diff_sequences(self._disk, self._buffer)
+        #Range of buffer lines changed since the last diff, "None" if there are no changes.
+        self._dirty: Optional[tuple[int, int]] = None
+
+    def on_line_changed(self, index: int, old: str, new: str) -> None:
+        self._buffer[index] = hash(new)
+        self._mark_dirty(index, index + 1)
+
+    def on_lines_inserted(self, index: int, lines: list[str]) -> None:
+        self._buffer[index:index] = hash_lines(lines)
+        self._move_positions(lambda pos: pos if pos < index else pos + len(lines))
+        self._mark_dirty(index, index + len(lines))
+
+    def on_lines_deleted(self, index: int, lines: list[str]) -> None:
+        del self._buffer[index:index + len(lines)]
+        #Positions inside the deleted lines collapse to where they were.
+        self._move_positions(lambda pos: pos if pos <= index else max(index, pos - len(lines)))
+        self._mark_dirty(index, index)
+
+    def on_reset(self) -> None:
+        self._buffer = hash_lines([""])
+        self._hunks = []
+        self._mark_dirty(0, 1)
+
+    #Sets the buffer as the new contents of the file, after it was saved.
+    def mark_saved(self) -> None:
+        self._disk = array("q", self._buffer)
+        self._hunks = []
+        self._dirty = None
+
+    #Returns the hunks, diffing the changed lines if needed.
+    def get_hunks(self) -> list[Hunk]:
+        self._update()
+
+        return self._hunks
+
+    #Returns the markers of the changed lines between "start" and "end", "end" not included, indexed by line.
+    def get_markers(self, start: int, end: int) -> dict[int, str]:
+        self._update()
+        markers = {}
+        last_line = len(self._buffer) - 1
+
+        for hunk in self._hunks[bisect_left(self._hunks, start, key = lambda hunk: hunk.buffer_end):]:
+            if hunk.buffer_start == hunk.buffer_end:
+                #Lines deleted at the end of the file are marked on the last line, unless it's marked already.
+                line = min(hunk.buffer_start, last_line)
+
+                if line >= end:
+                    break
+
+                markers.setdefault(line, DiffMarker.DELETED)
+            else:
+                if hunk.buffer_start >= end:
+                    break
+
+                marker = DiffMarker.ADDED if hunk.disk_start == hunk.disk_end else DiffMarker.MODIFIED
+
+                for line in range(max(hunk.buffer_start, start), min(hunk.buffer_end, end)):
+                    markers[line] = marker
+
+        return markers
+
+    #Returns the first line of the first change after the given line, or "None" if there isn't one.
+    def get_next_change(self, line: int) -> Optional[int]:
+        self._update()
+        index = bisect_right(self._hunks, line, key = lambda hunk: hunk.buffer_start)
+
+        if index == len(self._hunks):
+            return None
+
+        return min(self._hunks[index].buffer_start, len(self._buffer) - 1)
+
+    #Returns the first line of the last change before the given line, or "None" if there isn't one.
+    def get_previous_change(self, line: int) -> Optional[int]:
+        self._update()
+        index = bisect_left(self._hunks, line, key = lambda hunk: hunk.buffer_start)
+
+        if index == 0:
+            return None
+
+        return min(self._hunks[index - 1].buffer_start, len(self._buffer) - 1)
+
+    def _mark_dirty(self, start: int, end: int) -> None:
+        if self._dirty != None:
+            start = min(start, self._dirty[0])
+            end = max(end, self._dirty[1])
+
+        self._dirty = (start, end)
+
+    #Moves the dirty range and the buffer side of the hunks after a change, "move" maps a position before the change to one after it.
+    def _move_positions(self, move: Callable[[int], int]) -> None:
+        if self._dirty != None:
+            self._dirty = (move(self._dirty[0]), move(self._dirty[1]))
+
+        for hunk in self._hunks:
+            hunk.buffer_start = move(hunk.buffer_start)
+            hunk.buffer_end = move(hunk.buffer_end)
+
+    #Diffs the changed lines again. The region that's diffed is the dirty range plus the hunks touching it, the lines just outside of it are
+    #matched, so the hunks before and after it give the matching range of the file.
+    def _update(self) -> None:
+        if self._dirty == None:
+            return
+
+        (start, end) = self._dirty
+        self._dirty = None
+
+        first = bisect_left(self._hunks, start, key = lambda hunk: hunk.buffer_end)
+        last = bisect_right(self._hunks, end, key = lambda hunk: hunk.buffer_start)
+
+        if first < last:
+            start = min(start, self._hunks[first].buffer_start)
+            end = max(end, self._hunks[last - 1].buffer_end)
+
+        if first > 0:
+            previous = self._hunks[first - 1]
+            disk_start = previous.disk_end + start - previous.buffer_end
+        else:
+            disk_start = start
+
+        if last < len(self._hunks):
+            following = self._hunks[last]
+            disk_end = following.disk_start - (following.buffer_start - end)
+        else:
+            disk_end = len(self._disk) - (len(self._buffer) - end)
+
+        hunks = diff_sequences(self._disk[disk_start:disk_end], self._buffer[start:end])
+
+        for hunk in hunks:
+            hunk.buffer_start += start
+            hunk.buffer_end += start
+            hunk.disk_start += disk_start
+            hunk.disk_end += disk_start
+
+        self._hunks[first:last] = hunks
\ No newline at end of file
@@ -0,0 +1,121 @@
+import os
+from queue import Empty, Full, Queue
+from threading import Thread
+from typing import BinaryIO, Callable, Optional
+
+from buffer.line_array import LineArray, LineArrayListener
+from utils.compression import READ_ERRORS, Compression, open_text_reader
+from utils.scheduler import Scheduler
+
+
+#Approximate amount of characters read in each chunk of lines.
+LOAD_CHUNK_SIZE = 1 << 20
+#Maximum amount of chunks waiting to be inserted, the worker waits when there are this many, so only a few chunks are in memory at a time.
+MAX_QUEUED_CHUNKS = 4
+#Seconds between checks for loaded chunks.
+LOAD_INTERVAL = 0.01
+#Maximum amount of chunks inserted in a single check, so the editor stays responsive while loading.
+CHUNKS_PER_CHECK = 2
+
+
+#Loads a file into a line array without keeping the whole file in memory. The file is read, and decompressed if needed, on a worker thread,
+#which hands the lines over in chunks through a bounded queue. The chunks are inserted by a task in the scheduler, so the line array is only
+#modified by the main loop.
+#
+#The buffer can be edited while it's loading. The loader listens to the line array to keep the position the next chunk is inserted at after
+#the lines loaded so far.
+class FileLoader(LineArrayListener):
+    #"on_progress" is called with the fraction of the file read after chunks are inserted, "on_done" is called with an error message if the
+    #file couldn't be read or with "None" when it's fully loaded.
+    def __init__(self, l_array: LineArray, file: BinaryIO, compression: Optional[Compression], scheduler: Scheduler,
+        on_progress: Callable[[float], None], on_done: Callable[[Optional[str]], None]) -> None:
+        self._l_array = l_array
+        self._file = file
+        self._compression = compression
+        self._on_progress = on_progress
+        self._on_done = on_done
+
+        self._size = max(os.fstat(file.fileno()).st_size, 1)
+        #Holds lists of lines, the fraction of the file read is sent along with each of them. The end of the file is marked with "None", and
+        #an error with its message.
+        self._queue: Queue[tuple[Optional[list[str] | str], float]] = Queue(MAX_QUEUED_CHUNKS)
+        self._cancelled = False
+        self._position = 0
+
+        self._l_array.larray_add_listener(self)
+        self._task = scheduler.schedule_repeating(LOAD_INTERVAL, self._insert_chunks)
+        #A daemon thread doesn't keep the editor running if it's closed while loading.
+        Thread(target = self._read, daemon = True).start()
+
+    def on_lines_inserted(self, index: int, lines: list[str]) -> None:
+        if index <= self._position:
+            self._position += len(lines)
+
+    def on_lines_deleted(self, index: int, lines: list[str]) -> None:
+        if index < self._position:
+            self._position = max(index, self._position - len(lines))
+
+    #Stops loading, the lines loaded so far are kept.
+    def cancel(self) -> None:
+        self._cancelled = True
+        self._finish()
+
+    #Reads the file on the worker thread.
+    def _read(self) -> None:
+        end = ("The given file path cannot be read", 1)
+
+        try:
+            with self._file, open_text_reader(self._file, self._compression) as reader:
+                while not self._cancelled:
+                    lines = reader.readlines(LOAD_CHUNK_SIZE)
+
+                    if not lines:
+                        break
+
+                    self._put(([line.rstrip() for line in lines], self._file.tell() / self._size))
+
+            end = (None, 1)
+        except READ_ERRORS:
+            pass
+        finally:
+            #The end is queued whatever happens, otherwise the main loop would keep waiting for the rest of the file.
+            self._put(end)
+
+    #Adds to the queue, waiting while it's full unless loading is cancelled.
+    def _put(self, item: tuple[Optional[list[str] | str], float]) -> None:
+        while not self._cancelled:
+            try:
+                self._queue.put(item, timeout = LOAD_INTERVAL)
+                return
+            except Full:
+                pass
+
+    #Inserts the chunks that were read, run by the scheduler.
+    def _insert_chunks(self) -> None:
+        fraction = None
+
+        for _ in range(CHUNKS_PER_CHECK):
+            try:
+                (chunk, fraction) = self._queue.get_nowait()
+            except Empty:
+                break
+
+            if chunk == None or isinstance(chunk, str):
+                self._finish()
+                self._on_done(chunk)
+                return
+
+            #The listener moves the position past the inserted lines.
+            self._l_array.larray_insert_lines(self._position, chunk)
+
+        if fraction != None:
+            self._on_progress(fraction)
+
+    def _finish(self) -> None:
+        self._task.cancel()
+        self._l_array.larray_remove_listener(self)
+
+        #The line array starts with an empty line, the file is inserted before it.
+        if self._position == self._l_array.larray_get_length() - 1 and self._position > 0 and \
+            self._l_array.larray_get_data(self._position) == "":
+            self._l_array.larray_delete_line(self._position)
\ No newline at end of file
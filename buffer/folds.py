@@ -0,0 +1,259 @@
+from bisect import bisect_left, bisect_right
+from typing import TYPE_CHECKING, Optional
+
+from buffer.line_array import LineArray, LineArrayListener
+
+#The filtered view is imported when it's first used.
+if TYPE_CHECKING:
+    from buffer.line_filter import LineFilter
+
+
+#Closing brace of each opening brace, used for brace-based folding.
+BRACE_PAIRS = {"(": ")", "{": "}", "[": "]"}
+
+
+#Returns the indentation of the given line.
+def get_indentation(line: str) -> int:
+    return len(line) - len(line.lstrip(" \t"))
+
+
+#Keeps the folded regions of a line array. Each fold hides the lines between "start" and "end", "end" not included, the line before "start"
+#is the header of the fold and remains visible. Folds never overlap, folding a region that contains other folds replaces them.
+#
+#The lines of the buffer are shown in rows, a row is a line that isn't hidden. Besides the folds, the header row of each fold and the amount
+#of lines hidden before each fold are stored, so converting between lines and rows is a binary search. These are rebuilt whenever the folds
+#change, which depends on the amount of folds and not on the amount of lines. Inserting or deleting lines outside of the folds doesn't change
+#them, only the folds after the edit are moved, so typing after the last fold costs a binary search.
+#
+#A fold whose hidden lines are edited, by any means, is unfolded, so modified text is never left hidden.
+class FoldIndex(LineArrayListener):
+    def __init__(self) -> None:
+        self._set_folds([], [])
+
+    def on_line_changed(self, index: int, old: str, new: str) -> None:
+        if self._starts:
+            self.reveal(index)
+
+    def on_lines_inserted(self, index: int, lines: list[str]) -> None:
+        if not self._starts:
+            return
+
+        #The folds that start after the inserted lines are moved, a fold that gets lines inserted among its hidden lines is unfolded.
+        first_moved = bisect_right(self._starts, index)
+
+        if first_moved > 0 and index < self._ends[first_moved - 1]:
+            self._set_folds(self._starts[:first_moved - 1] + [start + len(lines) for start in self._starts[first_moved:]],
+                self._ends[:first_moved - 1] + [end + len(lines) for end in self._ends[first_moved:]])
+        else:
+            #The inserted lines are shown, so the header rows of the moved folds move as much as their lines.
+            self._move_folds(first_moved, len(lines))
+
+    def on_lines_deleted(self, index: int, lines: list[str]) -> None:
+        if not self._starts:
+            return
+
+        #The folds after the deleted lines are moved, a fold that loses its header or any hidden line is unfolded.
+        delete_end = index + len(lines)
+        first_unfolded = bisect_right(self._ends, index)
+        first_moved = bisect_left(self._starts, delete_end + 1)
+
+        if first_unfolded < first_moved:
+            self._set_folds(self._starts[:first_unfolded] + [start - len(lines) for start in self._starts[first_moved:]],
+                self._ends[:first_unfolded] + [end - len(lines) for end in self._ends[first_moved:]])
+        else:
+            #None of the deleted lines were hidden.
+            self._move_folds(first_moved, -len(lines))
+
+    def on_reset(self) -> None:
+        self._set_folds([], [])
+
+#################
+#Fold handling
+#################
+
+    #Folds the lines in the block started by the given header line, returns whether there was something to fold. The block is delimited by
+    #braces if the line has an unclosed opening brace, otherwise it's made of the following lines with a greater indentation.
+    def fold(self, l_array: LineArray, header: int) -> bool:
+        end = self._get_brace_block_end(l_array, header)
+
+        if end == None:
+            end = self._get_indentation_block_end(l_array, header)
+
+        if end <= header + 1:
+            return False
+
+        self._add_fold(header + 1, end)
+
+        return True
+
+    #Unfolds the fold with the given header line, returns whether there was one.
+    def unfold(self, header: int) -> bool:
+        index = bisect_left(self._starts, header + 1)
+
+        if index == len(self._starts) or self._starts[index] != header + 1:
+            return False
+
+        self._set_folds(self._starts[:index] + self._starts[index + 1:], self._ends[:index] + self._ends[index + 1:])
+
+        return True
+
+    #Folds every block that starts at the top level of indentation, blocks inside them are folded along with them.
+    def fold_all(self, l_array: LineArray) -> None:
+        starts = []
+        ends = []
+        header = 0
+        length = l_array.larray_get_length()
+
+        while header < length:
+            line = l_array.larray_get_data(header)
+
+            if line.strip() != "" and get_indentation(line) == 0:
+                end = self._get_indentation_block_end(l_array, header)
+
+                if end > header + 1:
+                    starts.append(header + 1)
+                    ends.append(end)
+                    header = end
+                    continue
+
+            header += 1
+
+        self._set_folds(starts, ends)
+
+    def unfold_all(self) -> None:
+        self._set_folds([], [])
+
+    #Unfolds the fold hiding the given line, if it's hidden.
+    def reveal(self, line: int) -> None:
+        index = bisect_right(self._starts, line) - 1
+
+        if index >= 0 and line < self._ends[index]:
+            self.unfold(self._starts[index] - 1)
+
+    #Returns whether the given line is the header of a fold.
+    def is_header(self, line: int) -> bool:
+        index = bisect_left(self._starts, line + 1)
+
+        return index < len(self._starts) and self._starts[index] == line + 1
+
+#################
+#Row handling
+#################
+
+    #Returns the row the given line is shown in, a hidden line is shown in the row of the header of its fold.
+    def line_to_row(self, line: int) -> int:
+        index = bisect_right(self._starts, line)
+
+        if index > 0 and line < self._ends[index - 1]:
+            return self._header_rows[index - 1]
+
+        return line - self._hidden_before[index]
+
+    #Returns the line shown in the given row.
+    def row_to_line(self, row: int) -> int:
+        #The folds with a header before the row are the ones hiding lines before it.
+        return row + self._hidden_before[bisect_left(self._header_rows, row)]
+
+    #Returns the amount of rows needed to show the given amount of lines.
+    def get_row_count(self, line_count: int) -> int:
+        return line_count - self._hidden_before[-1]
+
+#################
+#Helpers
+#################
+
+    #Adds the fold, replacing any fold inside of it.
+    def _add_fold(self, start: int, end: int) -> None:
+        first = bisect_left(self._starts, start)
+        last = bisect_left(self._starts, end)
+
+        self._set_folds(self._starts[:first] + [start] + self._starts[last:], self._ends[:first] + [end] + self._ends[last:])
+
+    #Moves the folds from the given one on by "amount" lines, along with their header rows, the amount of lines hidden doesn't change.
+    def _move_folds(self, first: int, amount: int) -> None:
+        for index in range(first, len(self._starts)):
+            self._starts[index] += amount
+            self._ends[index] += amount
+            self._header_rows[index] += amount
+
+    #Sets the folds and rebuilds the information used to convert between lines and rows.
+    def _set_folds(self, starts: list[int], ends: list[int]) -> None:
+        self._starts = starts
+        self._ends = ends
+        self._hidden_before = [0]
+        self._header_rows = []
+
+        for (start, end) in zip(starts, ends):
+            self._header_rows.append(start - 1 - self._hidden_before[-1])
+            self._hidden_before.append(self._hidden_before[-1] + end - start)
+
+    #If the header line has an unclosed opening brace returns the line with the matching closing brace, which is left visible. Otherwise
+    #returns "None".
+    def _get_brace_block_end(self, l_array: LineArray, header: int) -> Optional[int]:
+        stack = []
+
+        for y in range(header, l_array.larray_get_length()):
+            for char in l_array.larray_get_data(y):
+                if char in BRACE_PAIRS:
+                    stack.append(BRACE_PAIRS[char])
+                elif stack and char == stack[-1]:
+                    stack.pop()
+
+            #All the braces of the header are closed on the header itself.
+            if not stack:
+                return None if y == header else y
+
+        return None
+
+    #Returns the line after the last line of the block of lines more indented than the header, blank lines at the end of the block are left
+    #out of it.
+    def _get_indentation_block_end(self, l_array: LineArray, header: int) -> int:
+        header_indentation = get_indentation(l_array.larray_get_data(header))
+        end = header + 1
+
+        for y in range(header + 1, l_array.larray_get_length()):
+            line = l_array.larray_get_data(y)
+
+            if line.strip() == "":
+                continue
+            if get_indentation(line) <= header_indentation:
+                break
+
+            end = y + 1
+
+        return end
+
+
+#Converts between the lines of a buffer and the rows they are shown in. Rows skip the lines hidden by folds, or, while the filtered view is
+#enabled, the lines it doesn't show, the folds are ignored then. Cursors share the buffer's row map, so they follow the view when it changes.
+class RowMap:
+    def __init__(self, folds: FoldIndex) -> None:
+        self._folds = folds
+        #The filtered view, only set while it's enabled.
+        self.line_filter: Optional["LineFilter"] = None
+
+    def line_to_row(self, line: int) -> int:
+        if self.line_filter != None:
+            return self.line_filter.line_to_row(line)
+
+        return self._folds.line_to_row(line)
+
+    def row_to_line(self, row: int) -> int:
+        if self.line_filter != None:
+            return self.line_filter.row_to_line(row)
+
+        return self._folds.row_to_line(row)
+
+    #Returns the amount of rows needed to show the given amount of lines.
+    def get_row_count(self, line_count: int) -> int:
+        if self.line_filter != None:
+            return self.line_filter.get_row_count()
+
+        return self._folds.get_row_count(line_count)
+
+    #Makes the given line visible.
+    def reveal(self, line: int) -> None:
+        if self.line_filter != None:
+            self.line_filter.reveal(line)
+        else:
+            self._folds.reveal(line)
\ No newline at end of file
@@ -1,12 +1,14 @@
+from bisect import bisect_left
 from dataclasses import dataclass
-from hashlib import sha3_384
 from typing import Optional, Set
 
 from utils.point import Point
 
 
-#A class is used to be able to easily add more information later.
-@dataclass
+#A view of a line in the array. The array itself doesn't store "Line" objects, the text of the lines is kept in a list of strings and any
+#other per line information in separate structures that only hold entries for the lines that need them, this keeps the memory used per line
+#close to the size of the text. A "Line" is created when a line is requested.
+@dataclass(frozen = True, slots = True)
 class Line:
     #A string with the text in the line.
     data: str
@@ -14,8 +16,41 @@ class Line:
     highlight: Optional[Set[int]]
 
 
+#Base class for objects that need to follow the changes made to a line array, the methods are called after each change. The previous text of
+#the changed or deleted lines is given, so listeners don't need to keep a copy of it.
+class LineArrayListener:
+    #The line at the specified index changed from "old" to "new".
+    def on_line_changed(self, index: int, old: str, new: str) -> None:
+        pass
+
+    #The given lines were inserted starting at the specified index.
+    def on_lines_inserted(self, index: int, lines: list[str]) -> None:
+        pass
+
+    #The given lines, which started at the specified index, were deleted.
+    def on_lines_deleted(self, index: int, lines: list[str]) -> None:
+        pass
+
+    #All the lines were replaced by a single empty line.
+    def on_reset(self) -> None:
+        pass
+
+    #The line at "pos.y", whose text was "old", was split at "pos.x", the text after it was moved to a new line after it, following
+    #"indentation". Listeners that don't need to know where the text went get it as a changed line followed by an inserted one.
+    def on_line_split(self, pos: Point, old: str, indentation: str) -> None:
+        self.on_line_changed(pos.y, old, old[:pos.x])
+        self.on_lines_inserted(pos.y + 1, [f"{indentation}{old[pos.x:]}"])
+
+    #The line after "index" was appended to the line at "index", whose text was "old", and deleted. Listeners that don't need to know where
+    #the text went get it as a changed line followed by a deleted one.
+    def on_lines_joined(self, index: int, old: str, next_line: str) -> None:
+        self.on_line_changed(index, old, f"{old}{next_line}")
+        self.on_lines_deleted(index + 1, [next_line])
+
+
 class LineArray:
     def __init__(self) -> None:
+        self._listeners: list[LineArrayListener] = []
         self.larray_initialize()
 
 #################
@@ -26,63 +61,205 @@ class LineArray:
     def larray_add_newline(self, index: int) -> None:
         self._validate_index(index, True)
 
-        self._lines.insert(index, Line("", None))
+        self._lines.insert(index, "")
+        self._shift_highlights(index, 1)
+
+        for listener in self._listeners:
+            listener.on_lines_inserted(index, [""])
 
     #Inserts the given string at the specified position
     def larray_insert(self, pos: Point, string: str) -> None:
-        line_len = len(self._lines[pos.y].data)
+        line = self._lines[pos.y]
+        line_len = len(line)
 
         self._validate_position(pos)
 
         #We check where the character has to be inserted, this is because string slices are not very efficient to perform, the less they are
         #used the better.
         if pos.x == line_len:
-            self._lines[pos.y].data = f"{self._lines[pos.y].data}{string}"
+            self._lines[pos.y] = f"{line}{string}"
         elif pos.x == 0:
-            self._lines[pos.y].data = f"{string}{self._lines[pos.y].data}"
+            self._lines[pos.y] = f"{string}{line}"
         else:
-            self._lines[pos.y].data = f"{self._lines[pos.y].data[:pos.x]}{string}{self._lines[pos.y].data[pos.x:]}"
+            self._lines[pos.y] = f"{line[:pos.x]}{string}{line[pos.x:]}"
+
+        self._notify_line_changed(pos.y, line)
 
     #Deletes the specified position in the array.
     def larray_delete_pos(self, pos: Point) -> None:
         self._validate_position(pos)
-        line_len = len(self._lines[pos.y].data)
+        line = self._lines[pos.y]
+        line_len = len(line)
 
         if (pos.x == line_len):
-            self._lines[pos.y].data = self._lines[pos.y].data[:line_len - 1]
+            self._lines[pos.y] = line[:line_len - 1]
         else:
-            self._lines[pos.y].data = f"{self._lines[pos.y].data[:pos.x - 1]}{self._lines[pos.y].data[pos.x:]}"
+            self._lines[pos.y] = f"{line[:pos.x - 1]}{line[pos.x:]}"
+
+        self._notify_line_changed(pos.y, line)
+
+    #Splits the line at the specified position, the text after the position is moved to a new line below, after the given indentation.
+    def larray_split_line(self, pos: Point, indentation: str = "") -> None:
+        self._validate_position(pos)
+        line = self._lines[pos.y]
+
+        self._lines[pos.y] = line[:pos.x]
+        self._lines.insert(pos.y + 1, f"{indentation}{line[pos.x:]}")
+        self._shift_highlights(pos.y + 1, 1)
+
+        for listener in self._listeners:
+            listener.on_line_split(pos, line, indentation)
+
+    #Makes several splits, each given as the position and the indentation of its new line, sorted from the top of the array down. The changed
+    #lines are rebuilt and replaced with a single operation on the array, instead of inserting each new line by itself. The listeners are
+    #notified afterwards, as if the splits had been made one at a time from the bottom up.
+    def larray_split_lines(self, splits: list[tuple[Point, str]]) -> None:
+        if not splits:
+            return
+
+        for (pos, _) in splits:
+            self._validate_position(pos)
+
+        (first, last) = (splits[0][0].y, splits[-1][0].y)
+        old_lines = self._lines[first:last + 1]
+        span = []
+        #The line being split, and the indentation and the start of the text that goes into the next line taken from it.
+        (y, indentation_before, start) = (first, "", 0)
+
+        for (pos, indentation) in splits:
+            if pos.y != y:
+                span.append(f"{indentation_before}{old_lines[y - first][start:]}")
+                span.extend(old_lines[y - first + 1:pos.y - first])
+                (y, indentation_before, start) = (pos.y, "", 0)
+
+            span.append(f"{indentation_before}{old_lines[y - first][start:pos.x]}")
+            (indentation_before, start) = (indentation, pos.x)
+
+        span.append(f"{indentation_before}{old_lines[y - first][start:]}")
+        self._lines[first:last + 1] = span
+
+        #Each line is moved down by the amount of splits above it.
+        if self._highlights:
+            split_lines = [pos.y for (pos, _) in splits]
+            self._highlights = {i + bisect_left(split_lines, i): h for (i, h) in self._highlights.items()}
+
+        #Going from the bottom up, a split leaves its line cut at its position, that's what the splits to its left on the same line find.
+        previous = None
+
+        for (pos, indentation) in reversed(splits):
+            line = old_lines[pos.y - first]
+
+            if previous != None and previous.y == pos.y:
+                line = line[:previous.x]
+
+            for listener in self._listeners:
+                listener.on_line_split(pos, line, indentation)
+
+            previous = pos
+
+    #Appends the line after the specified index to the line at the index and deletes it.
+    def larray_join_lines(self, index: int) -> None:
+        self._validate_index(index + 1)
+        (line, next_line) = (self._lines[index], self._lines[index + 1])
+
+        self._lines[index] = f"{line}{next_line}"
+        del self._lines[index + 1]
+        self._highlights.pop(index + 1, None)
+        self._shift_highlights(index + 1, -1)
+
+        for listener in self._listeners:
+            listener.on_lines_joined(index, line, next_line)
 
     #Deletes the line at the specified index.
     def larray_delete_line(self, index: int) -> None:
         self._validate_index(index)
 
+        line = self._lines[index]
+
         del self._lines[index]
+        self._highlights.pop(index, None)
+        self._shift_highlights(index, -1)
+
+        for listener in self._listeners:
+            listener.on_lines_deleted(index, [line])
+
+    #Inserts the given lines starting at the specified index. The strings are stored as they are, so the lines can be shared with a copy of
+    #them, and they are inserted with a single operation on the array regardless of how many there are.
+    def larray_insert_lines(self, index: int, lines: list[str]) -> None:
+        self._validate_index(index, True)
+
+        self._lines[index:index] = lines
+        self._shift_highlights(index, len(lines))
+
+        for listener in self._listeners:
+            listener.on_lines_inserted(index, lines)
+
+    #Deletes the lines between "start" and "end", "end" not included, with a single operation on the array.
+    def larray_delete_lines(self, start: int, end: int) -> None:
+        self._validate_slice(start, end, len(self._lines))
+
+        deleted_lines = self._lines[start:end]
+        del self._lines[start:end]
+
+        if self._highlights:
+            self._highlights = {i: h for (i, h) in self._highlights.items() if not (start <= i < end)}
+            self._shift_highlights(end, start - end)
+
+        for listener in self._listeners:
+            listener.on_lines_deleted(start, deleted_lines)
 
     #Deletes the portion of text between "start" and "end" at the specified line.
     def larray_delete_slice(self, index: int, start: int, end: int) -> None:
         self._validate_index(index)
-        self._validate_slice(start, end, len(self._lines[index].data))
+        line = self._lines[index]
+        self._validate_slice(start, end, len(line))
+
+        self._lines[index] = f"{line[:start]}{line[end:]}"
 
-        self._lines[index].data = f"{self._lines[index].data[:start]}{self._lines[index].data[end:]}"
+        self._notify_line_changed(index, line)
 
     #Gets the character at the specified position.
     def larray_get_char(self, pos: Point) -> str:
         self._validate_position(pos)
 
-        return self._lines[pos.y].data[pos.x]
+        return self._lines[pos.y][pos.x]
 
     #Gets the line at the specified index.
     def larray_get_line(self, index: int) -> Line:
         self._validate_index(index)
 
+        return Line(self._lines[index], self._highlights.get(index))
+
+    #Gets the text of the lines between "start" and "end", "end" not included. The returned list references the strings in the array, no text
+    #is copied.
+    def larray_get_lines(self, start: int, end: int) -> list[str]:
+        self._validate_slice(start, end, len(self._lines))
+
+        return self._lines[start:end]
+
+    #Gets the text of the line at the specified index, it avoids creating a "Line" when only the text is needed.
+    def larray_get_data(self, index: int) -> str:
+        self._validate_index(index)
+
         return self._lines[index]
 
     #Sets the specified line of the array, allows for the highlighting to be set as well.
     def larray_set_line(self, index: int, string: str, highlight: Optional[Set[int]] = None) -> None:
         self._validate_index(index)
 
-        self._lines[index] = Line(string, highlight)
+        line = self._lines[index]
+        self._lines[index] = string
+        self._notify_line_changed(index, line)
+
+        if highlight == None:
+            self._highlights.pop(index, None)
+        else:
+            self._highlights[index] = highlight
+
+    #Calls the listeners after the line at the specified index was changed, "old" is its previous text.
+    def _notify_line_changed(self, index: int, old: str) -> None:
+        for listener in self._listeners:
+            listener.on_line_changed(index, old, self._lines[index])
 
 #################
 #Highlight handling
@@ -90,27 +267,45 @@ class LineArray:
     #Sets the portion of the line between "start" and "end" at the specified line as highlighted.
     def larray_highlight_slice(self, index: int, start: int, end: int) -> None:
         self._validate_index(index)
-        self._validate_slice(start, end, len(self._lines[index].data))
+        self._validate_slice(start, end, len(self._lines[index]))
 
         highlight_elems = {e for e in range(start, end)}
 
-        if self._lines[index].highlight == None:
-            self._lines[index].highlight = highlight_elems
+        if index not in self._highlights:
+            self._highlights[index] = highlight_elems
         else:
-            self._lines[index].highlight.update(highlight_elems)
+            self._highlights[index].update(highlight_elems)
 
 
-    #Clears the highlighted sections from all lines.
+    #Clears the highlighted sections from all lines. Only the lines that have highlighting are stored, so this doesn't depend on the length
+    #of the array, it's called on every modification of the buffer.
     def larray_highlight_clear(self) -> None:
-        for l in self._lines:
-            l.highlight = None
+        self._highlights.clear()
+
+    #Keeps the indexes of the highlighted lines valid after "amount" lines are inserted or removed at "index".
+    def _shift_highlights(self, index: int, amount: int) -> None:
+        if self._highlights:
+            self._highlights = {i + amount if i >= index else i: h for (i, h) in self._highlights.items()}
 
 #################
 #Array handling
 #################
     #Sets up the initial values of the "l_array".
     def larray_initialize(self) -> None:
-        self._lines: list[Line] = [Line("", None)]
+        #The text of each line. Empty lines all share the same empty string.
+        self._lines: list[str] = [""]
+        #The highlighted positions of each line that has highlighting, indexed by line.
+        self._highlights: dict[int, Set[int]] = {}
+
+        for listener in self._listeners:
+            listener.on_reset()
+
+    #Adds a listener that will be notified of every change to the array.
+    def larray_add_listener(self, listener: LineArrayListener) -> None:
+        self._listeners.append(listener)
+
+    def larray_remove_listener(self, listener: LineArrayListener) -> None:
+        self._listeners.remove(listener)
 
     #Returns the length of the line array.
     def larray_get_length(self) -> int:
@@ -118,8 +313,11 @@ class LineArray:
 
     #Returns the hash of the line array.
     def larray_get_hash(self) -> str:
+        #Only needed for hashing, it's imported here so it doesn't slow down the startup.
+        from hashlib import sha3_384
+
         #Only static objects can be hashed, we turn the list into a string.
-        list_as_text = "".join(line.data for line in self._lines)
+        list_as_text = "".join(self._lines)
         return sha3_384(list_as_text.encode('utf-8')).hexdigest()
 
 #################
@@ -133,7 +331,7 @@ class LineArray:
     #Validates the given position, raises an exception if it's invalid.
     def _validate_position(self, pos: Point) -> None:
         if pos.y < 0 or pos.y > len(self._lines) - 1:
-            if pos.x < 0 or pos.x > len(self._lines[pos.y].data) - 1:
+            if pos.x < 0 or pos.x > len(self._lines[pos.y]) - 1:
                 raise Exception("Invalid position in LineArray")
 
     #Validates the given slice, raises an exception if it's invalid.
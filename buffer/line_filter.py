@@ -0,0 +1,299 @@
+from array import array
+from bisect import bisect_left, bisect_right, insort
+import re
+from typing import Callable, Iterable
+
+from buffer.line_array import LineArray, LineArrayListener
+from utils.scheduler import Scheduler
+
+
+#Maximum amount of lines in a block of a "LineSet", a block is split when it grows to twice this size.
+BLOCK_SIZE = 2048
+#Amount of lines checked by the scan in each run, and seconds between runs.
+SCAN_CHUNK_SIZE = 50000
+SCAN_INTERVAL = 0.01
+
+
+#A sorted set of line indexes that can be shifted when lines are inserted or deleted before them. The indexes are kept in blocks, each with a
+#shift that is added to every index in it, so moving every index after an edit only touches a single block's indexes and then adjusts the
+#shift of the following blocks. With the first index and the amount of indexes before each block, finding the n-th index, or how many indexes
+#come before a line, are two binary searches. Every operation is proportional to the size of a block plus the amount of blocks, a set of
+#millions of lines has a few thousand blocks.
+class LineSet:
+    def __init__(self) -> None:
+        self._blocks: list[array] = []
+        self._shifts: list[int] = []
+        #The first line of each block, shift included.
+        self._firsts: list[int] = []
+        #The amount of lines before each block, with the total at the end.
+        self._counts: list[int] = [0]
+
+    def __len__(self) -> int:
+        return self._counts[-1]
+
+    #Returns the line at the given position of the set.
+    def get(self, rank: int) -> int:
+        block = bisect_right(self._counts, rank) - 1
+
+        return self._blocks[block][rank - self._counts[block]] + self._shifts[block]
+
+    #Returns the amount of lines in the set before the given line.
+    def rank(self, line: int) -> int:
+        block = bisect_left(self._firsts, line) - 1
+
+        if block < 0:
+            return 0
+
+        return self._counts[block] + bisect_left(self._blocks[block], line - self._shifts[block])
+
+    def contains(self, line: int) -> bool:
+        rank = self.rank(line)
+
+        return rank < len(self) and self.get(rank) == line
+
+    #Adds lines that come after every line in the set, the lines must be sorted.
+    def extend(self, lines: Iterable[int]) -> None:
+        lines = array("q", lines)
+
+        if not lines:
+            return
+
+        first_changed = len(self._blocks)
+
+        #The last block is filled before new blocks are started.
+        if self._blocks and len(self._blocks[-1]) < BLOCK_SIZE:
+            first_changed -= 1
+            free = BLOCK_SIZE - len(self._blocks[-1])
+            self._blocks[-1].extend(line - self._shifts[-1] for line in lines[:free])
+            lines = lines[free:]
+
+        for start in range(0, len(lines), BLOCK_SIZE):
+            self._blocks.append(lines[start:start + BLOCK_SIZE])
+            self._shifts.append(0)
+
+        self._rebuild(first_changed)
+
+    #Adds a line anywhere in the set.
+    def add(self, line: int) -> None:
+        if not self._blocks or line > self.get(len(self) - 1):
+            self.extend((line,))
+            return
+        if self.contains(line):
+            return
+
+        block = max(bisect_right(self._firsts, line) - 1, 0)
+        values = self._blocks[block]
+        values.insert(bisect_left(values, line - self._shifts[block]), line - self._shifts[block])
+
+        if len(values) >= BLOCK_SIZE * 2:
+            self._blocks[block + 1:block + 1] = [values[BLOCK_SIZE:]]
+            self._shifts[block + 1:block + 1] = [self._shifts[block]]
+            del values[BLOCK_SIZE:]
+
+        self._rebuild(block)
+
+    #Adds the lines between "start" and "end", "end" not included, none of them can be in the set. The block they fall in is split around
+    #them.
+    def add_range(self, start: int, end: int) -> None:
+        if not self._blocks or start > self.get(len(self) - 1):
+            self.extend(range(start, end))
+            return
+
+        block = max(bisect_right(self._firsts, start) - 1, 0)
+        values = self._blocks[block]
+        index = bisect_left(values, start - self._shifts[block])
+        new_blocks = [array("q", range(line, min(line + BLOCK_SIZE, end))) for line in range(start, end, BLOCK_SIZE)]
+        new_shifts = [0] * len(new_blocks)
+
+        if index < len(values):
+            new_blocks.append(values[index:])
+            new_shifts.append(self._shifts[block])
+            del values[index:]
+
+        #The lines go before the whole block.
+        if not values:
+            del self._blocks[block]
+            del self._shifts[block]
+            block -= 1
+
+        self._blocks[block + 1:block + 1] = new_blocks
+        self._shifts[block + 1:block + 1] = new_shifts
+        self._rebuild(max(block, 0))
+
+    #Removes the lines between "start" and "end", "end" not included.
+    def remove_range(self, start: int, end: int) -> None:
+        first_changed = None
+        block = max(bisect_right(self._firsts, start) - 1, 0)
+
+        while block < len(self._blocks) and self._firsts[block] < end:
+            values = self._blocks[block]
+            shift = self._shifts[block]
+            (low, high) = (bisect_left(values, start - shift), bisect_left(values, end - shift))
+
+            if low < high:
+                first_changed = block if first_changed == None else first_changed
+                del values[low:high]
+
+            #Empty blocks are dropped, they would break the search by first line.
+            if not values:
+                del self._blocks[block]
+                del self._shifts[block]
+                del self._firsts[block]
+            else:
+                block += 1
+
+        if first_changed != None:
+            self._rebuild(first_changed)
+
+    #Moves every line from "start" on by "amount", which can be negative. The lines can't be moved past lines before "start", those have to
+    #be removed first.
+    def shift(self, start: int, amount: int) -> None:
+        block = max(bisect_right(self._firsts, start) - 1, 0)
+
+        if block >= len(self._blocks):
+            return
+
+        #Only the part of the block the start falls in is moved one line at a time.
+        values = self._blocks[block]
+        index = bisect_left(values, start - self._shifts[block])
+        values[index:] = array("q", (value + amount for value in values[index:]))
+        self._firsts[block] = values[0] + self._shifts[block]
+
+        for following in range(block + 1, len(self._blocks)):
+            self._shifts[following] += amount
+            self._firsts[following] += amount
+
+    def clear(self) -> None:
+        self.__init__()
+
+    #Rebuilds the first lines and the counts from the given block on.
+    def _rebuild(self, first_block: int) -> None:
+        del self._firsts[first_block:]
+        del self._counts[first_block + 1:]
+
+        for block in range(first_block, len(self._blocks)):
+            self._firsts.append(self._blocks[block][0] + self._shifts[block])
+            self._counts.append(self._counts[-1] + len(self._blocks[block]))
+
+
+#Shows only the lines of a line array that match a regex, the filtered view. The lines are found by a scan that runs in chunks in the
+#scheduler, so a large buffer is shown as its lines are found, and the shown lines are kept in a "LineSet" so converting between rows and
+#lines takes the same time no matter how many lines are shown.
+#
+#The view stays editable. Lines that are edited keep being shown even if they no longer match, and lines inserted in the scanned part of the
+#buffer are shown, so the text being typed never disappears from the view. When shown lines are deleted the line before them is shown, it's
+#where their text goes when lines are joined. The scan decides for the lines it hasn't reached yet.
+class LineFilter(LineArrayListener):
+    #"on_progress" is called with the fraction of the lines scanned and the amount of lines found after each chunk.
+    def __init__(self, l_array: LineArray, regex: re.Pattern, scheduler: Scheduler, on_progress: Callable[[float, int], None]) -> None:
+        self._l_array = l_array
+        self._regex = regex
+        self._scheduler = scheduler
+        self._on_progress = on_progress
+
+        self._lines = LineSet()
+        #The lines before this one have been scanned.
+        self._scanned = 0
+        #Lines revealed that the scan hasn't reached, sorted. They are added to the set when the scan reaches them.
+        self._pending: list[int] = []
+        self._task = None
+
+        self._l_array.larray_add_listener(self)
+        self._start_scan()
+
+    def on_lines_inserted(self, index: int, lines: list[str]) -> None:
+        self._pending = [line + len(lines) if line >= index else line for line in self._pending]
+
+        if index >= self._scanned and self.is_scanning():
+            return
+
+        self._lines.shift(index, len(lines))
+        self._lines.add_range(index, index + len(lines))
+        self._scanned += len(lines)
+
+    def on_lines_deleted(self, index: int, lines: list[str]) -> None:
+        end = index + len(lines)
+        self._pending = [line - len(lines) if line >= end else line for line in self._pending if not index <= line < end]
+        count = len(self._lines)
+
+        self._lines.remove_range(index, end)
+        self._lines.shift(end, -len(lines))
+
+        if index < self._scanned:
+            self._scanned = max(index, self._scanned - len(lines))
+        if len(self._lines) < count and index > 0:
+            self.reveal(index - 1)
+
+    #The buffer was replaced, it's scanned again.
+    def on_reset(self) -> None:
+        self._lines.clear()
+        self._scanned = 0
+        self._pending = []
+
+        if not self.is_scanning():
+            self._start_scan()
+
+    #Stops the scan and stops following the line array.
+    def close(self) -> None:
+        if self._task != None:
+            self._task.cancel()
+            self._task = None
+
+        self._l_array.larray_remove_listener(self)
+
+    def is_scanning(self) -> bool:
+        return self._task != None
+
+    #Returns the amount of lines shown.
+    def get_count(self) -> int:
+        return len(self._lines)
+
+    #Shows the line even if it doesn't match.
+    def reveal(self, line: int) -> None:
+        if line < self._scanned or not self.is_scanning():
+            self._lines.add(line)
+        elif line not in self._pending:
+            insort(self._pending, line)
+
+#################
+#Row handling
+#################
+
+    #Returns the row the given line is shown in, a line that isn't shown is placed in the row of the closest line shown before it.
+    def line_to_row(self, line: int) -> int:
+        return max(self._lines.rank(line + 1) - 1, 0)
+
+    #Returns the line shown in the given row, line 0 if no line is shown.
+    def row_to_line(self, row: int) -> int:
+        return self._lines.get(row) if len(self._lines) > 0 else 0
+
+    def get_row_count(self) -> int:
+        return len(self._lines)
+
+#################
+#Scan handling
+#################
+
+    def _start_scan(self) -> None:
+        self._task = self._scheduler.schedule_repeating(SCAN_INTERVAL, self._scan_chunk)
+
+    #Scans the next chunk of lines, run by the scheduler.
+    def _scan_chunk(self) -> None:
+        end = min(self._scanned + SCAN_CHUNK_SIZE, self._l_array.larray_get_length())
+        search = self._regex.search
+        found = [y for (y, line) in enumerate(self._l_array.larray_get_lines(self._scanned, end), self._scanned) if search(line)]
+
+        #The revealed lines in the chunk are merged with the ones found.
+        if self._pending and self._pending[0] < end:
+            split = bisect_left(self._pending, end)
+            found = sorted(set(found).union(self._pending[:split]))
+            del self._pending[:split]
+
+        self._lines.extend(found)
+        self._scanned = end
+
+        if end == self._l_array.larray_get_length():
+            self._task.cancel()
+            self._task = None
+
+        self._on_progress(end / self._l_array.larray_get_length(), len(self._lines))
\ No newline at end of file
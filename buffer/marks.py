@@ -0,0 +1,263 @@
+from bisect import bisect_left, bisect_right
+from typing import Callable, Optional
+
+from buffer.line_array import LineArray, LineArrayListener
+from utils.point import Point
+
+
+#Maximum amount of marks in a block of a "MarkIndex", a block is split when it grows to twice this size.
+BLOCK_SIZE = 512
+
+
+#A position in the buffer that moves along with the text around it. The line is relative to the block the mark is in, see "MarkIndex".
+class Mark:
+    __slots__ = ("_block", "_line", "_column")
+
+    def __init__(self, block: "_MarkBlock", line: int, column: int) -> None:
+        self._block: Optional[_MarkBlock] = block
+        self._line = line
+        self._column = column
+
+
+class _MarkBlock:
+    __slots__ = ("marks", "shift")
+
+    def __init__(self, marks: list[Mark], shift: int) -> None:
+        self.marks = marks
+        #Added to the line of every mark in the block.
+        self.shift = shift
+
+        for mark in marks:
+            mark._block = self
+
+
+#Returns the position of a mark relative to its block, used to keep the blocks sorted.
+def _get_key(mark: Mark) -> tuple[int, int]:
+    return (mark._line, mark._column)
+
+
+#Keeps marks in a line array and moves them as the text before them changes. The marks are sorted by position and kept in blocks, the line of
+#a mark is relative to a shift shared by its block. When lines are inserted or deleted, only the marks of the block where the change happens
+#are moved one by one, the following blocks just get their shift adjusted, and changes within a line only touch the marks on that line. So an
+#edit costs the size of a block plus the amount of blocks, tens of thousands of marks are a few hundred blocks.
+#
+#Text inserted at a mark's position goes before the mark. A mark in deleted text ends up where the text was, a mark on a deleted line goes to
+#the start of the line that takes its place, or to the end of the previous line if the last lines are deleted.
+class MarkIndex(LineArrayListener):
+    def __init__(self, l_array: LineArray) -> None:
+        self._l_array = l_array
+        self._blocks: list[_MarkBlock] = []
+        #The position of the first mark of each block, shift included.
+        self._firsts: list[tuple[int, int]] = []
+        self._count = 0
+
+        self._l_array.larray_add_listener(self)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def on_line_changed(self, index: int, old: str, new: str) -> None:
+        if not self._blocks:
+            return
+
+        #The changed text is found by comparing the lines, what's in common at the start and end of both didn't change.
+        prefix = 0
+        max_prefix = min(len(old), len(new))
+
+        while prefix < max_prefix and old[prefix] == new[prefix]:
+            prefix += 1
+
+        suffix = 0
+        max_suffix = max_prefix - prefix
+
+        while suffix < max_suffix and old[-1 - suffix] == new[-1 - suffix]:
+            suffix += 1
+
+        old_end = len(old) - suffix
+        change = len(new) - len(old)
+
+        self._move_marks(index, prefix, index + 1, lambda line, column: (line, column + change if column >= old_end else prefix), 0)
+
+    def on_lines_inserted(self, index: int, lines: list[str]) -> None:
+        self._move_marks(index, 0, index, None, len(lines))
+
+    def on_lines_deleted(self, index: int, lines: list[str]) -> None:
+        #The last lines were deleted, there is no line taking their place.
+        if index == self._l_array.larray_get_length() and index > 0:
+            target = (index - 1, len(self._l_array.larray_get_data(index - 1)))
+        else:
+            target = (index, 0)
+
+        self._move_marks(index, 0, index + len(lines), lambda line, column: target, -len(lines))
+
+    def on_reset(self) -> None:
+        marks = [mark for block in self._blocks for mark in block.marks]
+
+        for mark in marks:
+            (mark._line, mark._column) = (0, 0)
+
+        self._set_marks(marks)
+
+    def on_line_split(self, pos: Point, old: str, indentation: str) -> None:
+        self._move_marks(pos.y, pos.x, pos.y + 1, lambda line, column: (line + 1, column - pos.x + len(indentation)), 1)
+
+    def on_lines_joined(self, index: int, old: str, next_line: str) -> None:
+        self._move_marks(index + 1, 0, index + 2, lambda line, column: (index, len(old) + column), -1)
+
+#################
+#Mark handling
+#################
+
+    #Adds a mark at the given position.
+    def add(self, pos: Point) -> Mark:
+        if not self._blocks:
+            self._blocks.append(_MarkBlock([], 0))
+            self._firsts.append((pos.y, pos.x))
+
+        block_index = max(bisect_right(self._firsts, (pos.y, pos.x)) - 1, 0)
+        block = self._blocks[block_index]
+        mark = Mark(block, pos.y - block.shift, pos.x)
+        block.marks.insert(bisect_right(block.marks, _get_key(mark), key = _get_key), mark)
+        self._count += 1
+
+        if len(block.marks) >= BLOCK_SIZE * 2:
+            self._blocks.insert(block_index + 1, _MarkBlock(block.marks[BLOCK_SIZE:], block.shift))
+            del block.marks[BLOCK_SIZE:]
+
+        self._rebuild(block_index)
+
+        return mark
+
+    #Removes the mark, it must be in the index.
+    def remove(self, mark: Mark) -> None:
+        block = mark._block
+        index = bisect_left(block.marks, _get_key(mark), key = _get_key)
+
+        #Marks at the same position are told apart by identity.
+        while block.marks[index] is not mark:
+            index += 1
+
+        del block.marks[index]
+        mark._block = None
+        self._count -= 1
+
+        block_index = self._blocks.index(block)
+
+        #Empty blocks are dropped, they would break the search by first position.
+        if not block.marks:
+            del self._blocks[block_index]
+
+        self._rebuild(block_index)
+
+    def clear(self) -> None:
+        for block in self._blocks:
+            for mark in block.marks:
+                mark._block = None
+
+        self._set_marks([])
+
+    #Returns the position of the mark.
+    def get_position(self, mark: Mark) -> Point:
+        return Point(mark._column, mark._line + mark._block.shift)
+
+    #Returns the marks on the lines between "start" and "end", "end" not included, sorted by position.
+    def get_marks(self, start: int, end: int) -> list[Mark]:
+        marks = []
+        (block_index, index) = self._locate(start, 0)
+
+        while block_index < len(self._blocks):
+            block = self._blocks[block_index]
+
+            for mark in block.marks[index:]:
+                if mark._line + block.shift >= end:
+                    return marks
+
+                marks.append(mark)
+
+            (block_index, index) = (block_index + 1, 0)
+
+        return marks
+
+    #Returns the first mark after the position, or "None" if there is none.
+    def get_next(self, pos: Point) -> Optional[Mark]:
+        (block_index, index) = self._locate(pos.y, pos.x + 1)
+
+        return self._blocks[block_index].marks[index] if block_index < len(self._blocks) else None
+
+    #Returns the last mark before the position, or "None" if there is none.
+    def get_previous(self, pos: Point) -> Optional[Mark]:
+        (block_index, index) = self._locate(pos.y, pos.x)
+
+        if index > 0:
+            return self._blocks[block_index].marks[index - 1]
+        if block_index > 0:
+            return self._blocks[block_index - 1].marks[-1]
+
+        return None
+
+#################
+#Helpers
+#################
+
+    #Returns the block and the index in the block of the first mark at the position or after it. If there is none the block is past the
+    #last one.
+    def _locate(self, line: int, column: int) -> tuple[int, int]:
+        #Marks at the same position can be split between blocks, the first block that can have one is the last one that starts before it.
+        block_index = bisect_left(self._firsts, (line, column)) - 1
+
+        if block_index < 0:
+            return (0, 0)
+
+        block = self._blocks[block_index]
+        index = bisect_left(block.marks, (line - block.shift, column), key = _get_key)
+
+        return (block_index, index) if index < len(block.marks) else (block_index + 1, 0)
+
+    #Moves the marks from the position (line, column) on. The ones on the lines before "end_line" are moved to the position returned by
+    #"move", which gets and returns the line and column of the mark, and the ones after are moved by "line_change" lines. The marks have to
+    #stay in order.
+    def _move_marks(self, line: int, column: int, end_line: int, move: Optional[Callable[[int, int], tuple[int, int]]],
+        line_change: int) -> None:
+        (first_block, index) = self._locate(line, column)
+        block_index = first_block
+
+        while block_index < len(self._blocks):
+            block = self._blocks[block_index]
+            marks = block.marks
+
+            while index < len(marks) and marks[index]._line + block.shift < end_line:
+                mark = marks[index]
+                (new_line, mark._column) = move(mark._line + block.shift, mark._column)
+                mark._line = new_line - block.shift
+                index += 1
+
+            #The rest of the marks come after "end_line".
+            if index < len(marks):
+                if line_change == 0:
+                    break
+
+                for mark in marks[index:]:
+                    mark._line += line_change
+
+                for following in self._blocks[block_index + 1:]:
+                    following.shift += line_change
+
+                break
+
+            (block_index, index) = (block_index + 1, 0)
+
+        if first_block < len(self._blocks):
+            self._rebuild(first_block)
+
+    #Replaces every mark, the marks must be sorted.
+    def _set_marks(self, marks: list[Mark]) -> None:
+        self._blocks = [_MarkBlock(marks[start:start + BLOCK_SIZE], 0) for start in range(0, len(marks), BLOCK_SIZE)]
+        self._count = len(marks)
+        self._rebuild(0)
+
+    #Rebuilds the first positions from the given block on.
+    def _rebuild(self, first_block: int) -> None:
+        del self._firsts[first_block:]
+
+        for block in self._blocks[first_block:]:
+            self._firsts.append((block.marks[0]._line + block.shift, block.marks[0]._column))
\ No newline at end of file
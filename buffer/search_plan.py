@@ -0,0 +1,124 @@
+from dataclasses import dataclass
+from functools import lru_cache, partial
+import re
+from typing import Callable, Optional
+
+#The parser of the "re" module, used to find the literal text a regex requires. It's private, so the old public name is tried too.
+try:
+    from re import _parser as regex_parser
+    from re import _constants as regex_constants
+except ImportError:
+    import sre_parse as regex_parser
+    import sre_constants as regex_constants
+
+
+#Operations of a parsed regex that repeat what they contain.
+REPEAT_OPS = {regex_constants.MAX_REPEAT, regex_constants.MIN_REPEAT, getattr(regex_constants, "POSSESSIVE_REPEAT", None)}
+
+
+#How a regex is searched. "literal" is a string every match contains, so only the lines that contain it can match, it's "None" if there is
+#none. If "is_literal" is set the regex matches "literal" and nothing else, so it's searched for without using the regex at all. "find_all"
+#returns the (start, end) position of every match in a line.
+@dataclass(frozen = True)
+class SearchPlan:
+    regex: re.Pattern
+    literal: Optional[str]
+    is_literal: bool
+    find_all: Callable[[str], list[tuple[int, int]]]
+
+
+#Compiles the regex and finds the longest literal it requires. Plans are cached since the same queries are searched repeatedly while they are
+#being typed. Raises "re.error" if the regex isn't valid.
+@lru_cache(maxsize = 64)
+def plan_search(regex: str) -> SearchPlan:
+    compiled_re = re.compile(regex)
+    parsed = regex_parser.parse(regex)
+    literals = []
+
+    #Case insensitive regexes match text that differs from their literals.
+    if not parsed.state.flags & re.IGNORECASE:
+        _add_required_literals(parsed, literals)
+
+    literal = max(literals, key = len, default = "")
+    is_literal = literal != "" and len(literal) == len(parsed) and all(op == regex_constants.LITERAL for (op, _) in parsed)
+
+    if is_literal:
+        find_all = partial(_find_literal, literal)
+    else:
+        find_all = partial(_find_regex, compiled_re.search, compiled_re.finditer)
+
+    return SearchPlan(compiled_re, literal if literal != "" else None, is_literal, find_all)
+
+
+def _find_literal(literal: str, line: str) -> list[tuple[int, int]]:
+    matches = []
+    length = len(literal)
+    start = line.find(literal)
+
+    while start != -1:
+        matches.append((start, start + length))
+        start = line.find(literal, start + length)
+
+    return matches
+
+
+#Most lines searched don't match, checking for a single match first is faster than starting an iteration.
+def _find_regex(search: Callable, finditer: Callable, line: str) -> list[tuple[int, int]]:
+    if search(line) == None:
+        return []
+
+    return [match.span() for match in finditer(line)]
+
+
+#Adds the literals every match of the parsed regex contains to the list. A literal is a run of consecutive characters, groups and repetitions
+#that happen at least once are looked into, alternatives and optional parts are skipped.
+def _add_required_literals(parsed: list, literals: list[str]) -> None:
+    run = []
+
+    for (op, argument) in parsed:
+        if op == regex_constants.LITERAL:
+            run.append(chr(argument))
+            continue
+
+        literals.append("".join(run))
+        run = []
+
+        if op == regex_constants.SUBPATTERN:
+            (_, add_flags, _, group) = argument
+
+            if not add_flags & re.IGNORECASE:
+                _add_required_literals(group, literals)
+        elif op in REPEAT_OPS:
+            (minimum, _, group) = argument
+
+            if minimum > 0:
+                _add_required_literals(group, literals)
+        elif op == getattr(regex_constants, "ATOMIC_GROUP", None):
+            _add_required_literals(argument, literals)
+
+    literals.append("".join(run))
+
+
+#Returns the indexes of the lines of the text, joined with line breaks, that contain the literal. The text is searched with "str.find", which
+#skips the lines without the literal much faster than matching a regex on each line.
+def find_lines_with(text: str, literal: str) -> list[int]:
+    lines = []
+    line = 0
+    #The start of the line "line".
+    position = 0
+
+    while True:
+        found = text.find(literal, position)
+
+        if found == -1:
+            return lines
+
+        line += text.count("\n", position, found)
+        lines.append(line)
+        #The search goes on from the next line, the line is already a candidate.
+        position = text.find("\n", found) + 1
+
+        if position == 0:
+            return lines
+
+        line += 1
\ No newline at end of file
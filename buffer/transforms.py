@@ -0,0 +1,272 @@
+from array import array
+from heapq import merge
+import os.path
+import re
+from tempfile import TemporaryDirectory
+from threading import Thread
+from typing import Callable, Iterator, Optional
+
+from utils.scheduler import Scheduler
+
+
+#Estimated memory a sort can use, larger sorts are done in runs stored on disk. The lines themselves are already in memory, what the budget
+#bounds is what sorting adds on top of them, the references to the sorted lines and the keys of the lines, which for numeric and regex keys
+#are about as large as the lines themselves.
+SORT_MEMORY_BUDGET = 256 * 1024 * 1024
+#Estimated memory used by each line while sorting besides its characters, the references to it and its key.
+LINE_OVERHEAD = 100
+#Amount of lines between checks for cancellation while going through the lines.
+CHECK_INTERVAL = 10000
+#Amount of line indexes read at a time from each run file while merging.
+RUN_READ_SIZE = 8192
+#Seconds between progress updates while a transform runs.
+PROGRESS_INTERVAL = 0.1
+
+#Matches the number at the start of a line for numeric sorting.
+NUMBER_RE = re.compile(r"\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)")
+
+
+#Raised from a transform when it's cancelled.
+class TransformCancelled(Exception):
+    pass
+
+
+#Used by a transform running on a worker thread to report its progress, which is read by the main loop, and to know if it was cancelled.
+class TransformTask:
+    def __init__(self) -> None:
+        self.progress = 0.0
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+    #Sets the fraction of the work done, raises "TransformCancelled" if the transform was cancelled.
+    def report(self, progress: float) -> None:
+        if self.cancelled:
+            raise TransformCancelled()
+
+        self.progress = progress
+
+
+#A transform takes the lines of the buffer and returns the transformed lines, the given lines must not be modified.
+Transform = Callable[[list[str], TransformTask], list[str]]
+
+
+#Runs the transform on the lines in a worker thread, so the editor stays responsive and the transform can be cancelled. "on_progress" is
+#called with the fraction of the work done, and "on_done" with the transformed lines, or with an error message. Both are called by the
+#scheduler, on the main loop. "on_done" isn't called if the transform is cancelled.
+def run_transform(lines: list[str], transform: Transform, scheduler: Scheduler, on_progress: Callable[[float], None],
+    on_done: Callable[[list[str] | str], None]) -> TransformTask:
+    task = TransformTask()
+    progress_task = scheduler.schedule_repeating(PROGRESS_INTERVAL, lambda: on_progress(task.progress))
+
+    def finish(result: list[str] | str) -> None:
+        progress_task.cancel()
+
+        if not task.cancelled:
+            on_done(result)
+
+    def work() -> None:
+        try:
+            result = transform(lines, task)
+        except TransformCancelled:
+            result = "Cancelled"
+        #Sorts that don't fit in memory write their runs to disk.
+        except OSError:
+            result = "The temporary files for sorting could not be written"
+        #Any other failure, such as running out of memory, still has to finish the task, otherwise it would be left running forever.
+        except Exception as error:
+            result = f"The transform failed: {str(error) or type(error).__name__}"
+
+        scheduler.schedule(0, lambda: finish(result))
+
+    #A daemon thread doesn't keep the editor running if it's closed during a transform.
+    Thread(target = work, daemon = True).start()
+
+    return task
+
+
+#Returns the number at the start of the line, lines that don't start with a number sort as zero. The line is the second element of the key so
+#equal numbers are sorted by their text.
+def get_numeric_key(line: str) -> tuple[float, str]:
+    match = NUMBER_RE.match(line)
+
+    return (float(match.group(1)) if match else 0.0, line)
+
+
+#Returns a key that sorts lines by the first match of the regex, or by its first group if it has groups. Lines that don't match sort first.
+def get_regex_key(regex: re.Pattern) -> Callable[[str], str]:
+    def key(line: str) -> str:
+        match = regex.search(line)
+
+        if match == None:
+            return ""
+
+        return match.group(1) if regex.groups > 0 and match.group(1) != None else match.group(0)
+
+    return key
+
+
+#Returns the lines sorted by the key, the sort is stable. If sorting in memory would take more than "memory_budget" bytes, the lines are sorted
+#in runs that fit the budget, the runs are written to temporary files and merged.
+def sort_lines(lines: list[str], task: TransformTask, key: Optional[Callable[[str], object]] = None, reverse: bool = False,
+    memory_budget: int = SORT_MEMORY_BUDGET) -> list[str]:
+    #Keys other than the line itself take about as much memory as the line, the lines themselves are only referenced.
+    line_factor = 0 if key == None else 1
+    runs = []
+    run_start = 0
+    run_size = 0
+
+    #Splits the lines into runs, each one fitting the budget.
+    for (y, line) in enumerate(lines):
+        run_size += len(line) * line_factor + LINE_OVERHEAD
+
+        if run_size > memory_budget:
+            runs.append((run_start, y + 1))
+            run_start = y + 1
+            run_size = 0
+
+        if y % CHECK_INTERVAL == 0:
+            task.report(0)
+
+    if not runs:
+        task.report(0.5)
+        sorted_lines = sorted(lines, key = key, reverse = reverse)
+        task.report(1)
+
+        return sorted_lines
+
+    if run_start < len(lines):
+        runs.append((run_start, len(lines)))
+
+    return _external_sort(lines, runs, task, key, reverse)
+
+
+#Sorts each run and writes it to a temporary file, then merges the files with a heap. The runs store the indexes of the lines, not their text,
+#so the sorted lines are the same strings as the given ones, as when sorting in memory, and aren't duplicated by reading them back. The keys
+#are computed again while merging instead of being kept. Half of the progress is sorting the runs and half is merging them.
+def _external_sort(lines: list[str], runs: list[tuple[int, int]], task: TransformTask, key: Optional[Callable[[str], object]],
+    reverse: bool) -> list[str]:
+    line_key = lines.__getitem__ if key == None else lambda index: key(lines[index])
+
+    with TemporaryDirectory(prefix = "console_editor_sort_") as directory:
+        run_files = []
+
+        for (index, (start, end)) in enumerate(runs):
+            run_file = os.path.join(directory, f"run_{index}")
+
+            with open(run_file, "wb") as file:
+                array("q", sorted(range(start, end), key = line_key, reverse = reverse)).tofile(file)
+
+            run_files.append(run_file)
+            task.report((index + 1) / len(runs) / 2)
+
+        readers = [_read_run(run_file) for run_file in run_files]
+        sorted_lines = []
+
+        try:
+            #The merge is stable, lines with equal keys come out in the order of their runs.
+            for index in merge(*readers, key = line_key, reverse = reverse):
+                sorted_lines.append(lines[index])
+
+                if len(sorted_lines) % CHECK_INTERVAL == 0:
+                    task.report(0.5 + len(sorted_lines) / len(lines) / 2)
+        finally:
+            for reader in readers:
+                reader.close()
+
+        task.report(1)
+
+        return sorted_lines
+
+
+#Yields the line indexes of a run file, they are read in chunks.
+def _read_run(run_file: str) -> Iterator[int]:
+    with open(run_file, "rb") as file:
+        while True:
+            indexes = array("q")
+            indexes.frombytes(file.read(RUN_READ_SIZE * indexes.itemsize))
+
+            if not indexes:
+                return
+
+            yield from indexes
+
+
+#Returns the lines without duplicates, the first occurrence of each line is kept.
+def unique_lines(lines: list[str], task: TransformTask) -> list[str]:
+    task.report(0)
+    #Dictionaries keep the insertion order.
+    unique = list(dict.fromkeys(lines))
+    task.report(1)
+
+    return unique
+
+
+def reverse_lines(lines: list[str], task: TransformTask) -> list[str]:
+    task.report(0)
+
+    return lines[::-1]
+
+
+#Returns the lines that match the regex, or the ones that don't if "keep" is "False".
+def filter_lines(lines: list[str], task: TransformTask, regex: re.Pattern, keep: bool) -> list[str]:
+    filtered = []
+
+    for start in range(0, len(lines), CHECK_INTERVAL):
+        task.report(start / max(len(lines), 1))
+        filtered.extend(line for line in lines[start:start + CHECK_INTERVAL] if (regex.search(line) != None) == keep)
+
+    task.report(1)
+
+    return filtered
+
+
+#Parses a transform command, returns its name and the transform, or an error message if the command isn't valid. The commands are:
+#   sort [-r] [-n] [REGEX]  Sorts the lines, "-r" sorts in reverse, "-n" sorts by the number at the start of each line and REGEX sorts by the
+#                           first match of the regex, or its first group. Options can be combined, "--" ends them.
+#   unique                  Removes duplicated lines.
+#   reverse                 Reverses the order of the lines.
+#   keep REGEX              Keeps only the lines that match the regex.
+#   drop REGEX              Removes the lines that match the regex.
+def parse_transform(command: str) -> tuple[str, Transform] | str:
+    (name, _, argument) = command.strip().partition(" ")
+    argument = argument.strip()
+
+    try:
+        match name:
+            case "sort":
+                options = set()
+
+                #The options come before the regex, they can be combined, as in "-rn". "--" ends them, for regexes that start with "-".
+                while argument.startswith("-"):
+                    (option, argument) = (argument.split(None, 1) + [""])[:2]
+
+                    if option == "--":
+                        break
+                    if option == "-" or not set(option[1:]).issubset("rn"):
+                        return f"Unknown sort option \"{option}\", use: sort [-r] [-n] [REGEX]"
+
+                    options.update(option[1:])
+
+                (reverse, numeric) = ("r" in options, "n" in options)
+
+                if numeric and argument:
+                    return "A numeric sort can't have a regex"
+
+                key = get_numeric_key if numeric else get_regex_key(re.compile(argument)) if argument else None
+
+                return ("Sort", lambda lines, task: sort_lines(lines, task, key, reverse))
+            case "unique" if not argument:
+                return ("Unique", unique_lines)
+            case "reverse" if not argument:
+                return ("Reverse", reverse_lines)
+            case "keep" | "drop" if argument:
+                regex = re.compile(argument)
+                keep = name == "keep"
+
+                return ("Keep" if keep else "Drop", lambda lines, task: filter_lines(lines, task, regex, keep))
+    except re.error:
+        return "Invalid regex"
+
+    return "Unknown transform, use: sort [-r] [-n] [REGEX], unique, reverse, keep REGEX or drop REGEX"
\ No newline at end of file
@@ -0,0 +1,108 @@
+from bisect import bisect_left
+from collections import Counter
+from heapq import nlargest
+import re
+
+from buffer.line_array import LineArrayListener
+
+
+#Matches identifiers, a letter or underscore followed by letters, digits or underscores.
+IDENTIFIER_RE = re.compile(r"[^\W\d]\w*")
+#Shorter words aren't worth completing.
+MIN_WORD_LENGTH = 3
+#Maximum amount of candidates that are ranked for a completion, when more words share the prefix only the most frequent ones are kept.
+MAX_CANDIDATES = 256
+
+
+#Returns the identifiers of the given line that can be completed.
+def get_words(line: str) -> list[str]:
+    return [word for word in IDENTIFIER_RE.findall(line) if len(word) >= MIN_WORD_LENGTH]
+
+
+#Keeps a count of every identifier in a line array, it's updated as lines change, only the changed lines are tokenized. The identifiers are
+#also kept in a sorted list, so the ones starting with a prefix are found with a binary search. Edits only update the counts and note the
+#words that appeared or disappeared, the sorted list is brought up to date when candidates are requested. So loading or pasting many new
+#words costs a dictionary update per distinct word, and the list is sorted when completing, which takes about a pass over it when few words
+#changed, since it's mostly sorted already.
+class WordIndex(LineArrayListener):
+    def __init__(self) -> None:
+        self._counts: dict[str, int] = {}
+        self._sorted_words: list[str] = []
+        #Words that appeared or disappeared since the sorted list was updated.
+        self._added: set[str] = set()
+        self._removed: set[str] = set()
+
+    def on_line_changed(self, index: int, old: str, new: str) -> None:
+        self._remove_words(Counter(get_words(old)))
+        self._add_words(Counter(get_words(new)))
+
+    #The lines are tokenized together, identifiers never span lines.
+    def on_lines_inserted(self, index: int, lines: list[str]) -> None:
+        self._add_words(Counter(get_words("\n".join(lines))))
+
+    def on_lines_deleted(self, index: int, lines: list[str]) -> None:
+        self._remove_words(Counter(get_words("\n".join(lines))))
+
+    def on_reset(self) -> None:
+        self.__init__()
+
+    #Returns the amount of times the word appears.
+    def get_count(self, word: str) -> int:
+        return self._counts.get(word, 0)
+
+    #Returns the words that start with the given prefix, not including the prefix itself. If there are more than "MAX_CANDIDATES" only the
+    #most frequent ones are returned.
+    def get_candidates(self, prefix: str) -> list[str]:
+        self._update_sorted_words()
+
+        start = bisect_left(self._sorted_words, prefix)
+        end = start
+
+        while end < len(self._sorted_words) and self._sorted_words[end].startswith(prefix):
+            end += 1
+
+        candidates = [word for word in self._sorted_words[start:end] if word != prefix]
+
+        if len(candidates) > MAX_CANDIDATES:
+            candidates = nlargest(MAX_CANDIDATES, candidates, key = self._counts.__getitem__)
+
+        return candidates
+
+    #Adds the words, "words" holds how many times each one was added.
+    def _add_words(self, words: Counter) -> None:
+        for (word, added) in words.items():
+            count = self._counts.get(word, 0)
+
+            if count == 0:
+                #A word removed and added again is still in the sorted list.
+                if word in self._removed:
+                    self._removed.discard(word)
+                else:
+                    self._added.add(word)
+
+            self._counts[word] = count + added
+
+    def _remove_words(self, words: Counter) -> None:
+        for (word, removed) in words.items():
+            count = self._counts[word] - removed
+
+            if count == 0:
+                del self._counts[word]
+
+                if word in self._added:
+                    self._added.discard(word)
+                else:
+                    self._removed.add(word)
+            else:
+                self._counts[word] = count
+
+    #Applies the words that appeared or disappeared to the sorted list.
+    def _update_sorted_words(self) -> None:
+        if self._removed:
+            self._sorted_words = [word for word in self._sorted_words if word not in self._removed]
+            self._removed = set()
+
+        if self._added:
+            #The list is sorted, so sorting it with the new words at the end only takes about a pass over it.
+            self._sorted_words = sorted(self._sorted_words + list(self._added))
+            self._added = set()
\ No newline at end of file
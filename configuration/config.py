@@ -1,20 +1,89 @@
+import marshal
+import os
 import os.path
 from typing import Optional
-from yaml import safe_load
+
+#The configuration file is next to this module, so the editor can be started from any directory.
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.yaml")
+#Parsing the YAML file is slower than the rest of the startup, the parsed configuration is stored along with the compiled modules and loaded
+#from there while the YAML file isn't modified.
+SNAPSHOT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "__pycache__")
+#Changing what is stored in the snapshot requires increasing the version, so old snapshots are ignored.
+SNAPSHOT_VERSION = 1
+#Sections every configuration has, a snapshot without them is ignored.
+REQUIRED_SECTIONS = ("COLOURS", "GENERAL CONFIG")
 
 #The configuration class, uses a singleton pattern to only load the configuration file once and to make it accessible without needing a reference
 #to the "Config" class.
 class Config(object):
     _CONFIG: Optional[dict] = None
 
-    def __init__(self, config_file: str) -> None:
+    def __init__(self, config_file: str = CONFIG_FILE) -> None:
         if not os.path.exists(config_file):
             raise FileNotFoundError("The configuration file doesn't exist")
 
         if Config._CONFIG is None:
+            Config._CONFIG = Config._load_snapshot(config_file)
+
+        if Config._CONFIG is None:
+            #The YAML parser is only imported when the snapshot can't be used.
+            from yaml import safe_load
+
             with open(config_file, "r") as file:
                 Config._CONFIG = safe_load(file)
 
+            Config._save_snapshot(config_file, Config._CONFIG)
+
     @staticmethod
     def get_config() -> Optional[dict]:
-        return Config._CONFIG
\ No newline at end of file
+        return Config._CONFIG
+
+    #Returns the configuration stored in the snapshot of the file, or "None" if there is no snapshot or it's not valid. A snapshot is only
+    #valid if it was taken from the file as it is now, which is known by its modification time and size.
+    @staticmethod
+    def _load_snapshot(config_file: str) -> Optional[dict]:
+        try:
+            with open(Config._get_snapshot_file(config_file), "rb") as file:
+                snapshot = marshal.load(file)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+
+        if not isinstance(snapshot, tuple) or len(snapshot) != 4 or snapshot[:3] != (SNAPSHOT_VERSION, *Config._get_file_key(config_file)):
+            return None
+
+        config = snapshot[3]
+
+        if not isinstance(config, dict) or not all(isinstance(config.get(section), dict) for section in REQUIRED_SECTIONS):
+            return None
+
+        return config
+
+    #Stores the parsed configuration, if the snapshot can't be written the file is just parsed again on the next start.
+    @staticmethod
+    def _save_snapshot(config_file: str, config: dict) -> None:
+        snapshot_file = Config._get_snapshot_file(config_file)
+        temporary_file = f"{snapshot_file}.{os.getpid()}.tmp"
+
+        try:
+            os.makedirs(SNAPSHOT_DIRECTORY, exist_ok = True)
+
+            with open(temporary_file, "wb") as file:
+                marshal.dump((SNAPSHOT_VERSION, *Config._get_file_key(config_file), config), file)
+
+            #Replacing the snapshot in a single step, another editor starting at the same time never reads a partial snapshot.
+            os.replace(temporary_file, snapshot_file)
+        #Values that marshal can't store also end up here.
+        except (OSError, ValueError):
+            if os.path.exists(temporary_file):
+                os.remove(temporary_file)
+
+    @staticmethod
+    def _get_snapshot_file(config_file: str) -> str:
+        return os.path.join(SNAPSHOT_DIRECTORY, f"{os.path.basename(config_file)}.snapshot")
+
+    #Returns the modification time and size of the file, the snapshot is only valid while they don't change.
+    @staticmethod
+    def _get_file_key(config_file: str) -> tuple[int, int]:
+        stat = os.stat(config_file)
+
+        return (stat.st_mtime_ns, stat.st_size)
\ No newline at end of file
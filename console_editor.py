@@ -1,44 +1,89 @@
 from asciimatics.screen import Screen, ManagedScreen
 from asciimatics.event import MouseEvent
+from typing import TYPE_CHECKING, Optional
+import os.path
 
 from buffer.buffer import Buffer
 from buffer.cursor import CursorMoveDirection
 from display.display import Display
+from display.direct_screen import DirectScreen
 from utils.prompts import InputPrompt, ConfirmationPrompt
 from utils.info_bar import InfoBar
+from utils.clipboard import Clipboard
+from utils.columns import TAB_WIDTH
+from utils.scheduler import Scheduler, ScheduledTask
+from utils.session import Session, load_session, save_session
 from utils.point import Point
 from configuration.config import Config
 
+if TYPE_CHECKING:
+    from utils.control_server import ControlServer
+
+#Key codes of the shifted arrow keys, these are the curses key codes, which asciimatics passes through as they are.
+KEY_SHIFT_LEFT = 393
+KEY_SHIFT_RIGHT = 402
+KEY_SHIFT_UP = 337
+KEY_SHIFT_DOWN = 336
+
+#Seconds without typing after which the find-as-you-type search is performed.
+SEARCH_DEBOUNCE = 0.15
+
 class ConsoleEditor():
     def __init__(self) -> None:
-        self.config = Config("configuration/config.yaml")
+        self.config = Config()
         self.buffer = Buffer()
-        self.info_bar = InfoBar("Commands: Ctrl+O: Write Out - Ctrl+R: Read File - Ctrl+Q: Quit - Ctrl+F: Find - Ctrl+P: Replace", 3.5)
+        self.clipboard = Clipboard()
+        self.scheduler = Scheduler()
+        self.info_bar = InfoBar("Commands: Ctrl+O: Write Out - Ctrl+R: Read File - Ctrl+Q: Quit - Ctrl+F: Find - Ctrl+P: Replace", 3.5,
+            self.scheduler)
         self.display = Display(self.buffer, self.info_bar)
 
         self.input_prompt = None
         self.confirmation_prompt = None
+        #The pending find-as-you-type search, if any.
+        self._search_task: Optional[ScheduledTask] = None
+        self._control_server: Optional["ControlServer"] = None
 
     def create_prompts(self, screen: Screen) -> None:
         self.input_prompt = InputPrompt(screen, Point(0, screen.dimensions[0] - 1), screen.dimensions[1],
-            Screen.COLOUR_WHITE, Screen.COLOUR_BLACK)
+            Screen.COLOUR_WHITE, Screen.COLOUR_BLACK, self.scheduler)
         self.confirmation_prompt = ConfirmationPrompt(screen, Point(0, screen.dimensions[0] - 1), screen.dimensions[1],
             Screen.COLOUR_WHITE, Screen.COLOUR_BLACK)
 
     def console_editor(self) -> None:
         with ManagedScreen() as screen:
+            if Config.get_config()["GENERAL CONFIG"]["output"]["direct output"]:
+                screen = DirectScreen(screen)
+
             self.create_prompts(screen)
 
+            #The first frame is drawn before restoring the session, the file is then loaded in the background.
+            self.display.display_to_screen(screen)
+
+            if Config.get_config()["GENERAL CONFIG"]["session"]["restore session"]:
+                self._restore_session()
+            if Config.get_config()["GENERAL CONFIG"]["control socket"]["enable control socket"]:
+                self._start_control_server()
+
             while True:
-                self.get_input(screen)
-                self.display.display_to_screen(screen)
+                #Only redraw when something could have changed, either input was handled or a scheduled task ran.
+                if self.get_input(screen):
+                    self.scheduler.wake()
+                self.scheduler.run_pending()
+
+                if self.scheduler.consume_redraw():
+                    self.display.display_to_screen(screen)
+
+                #Sleep until there is input or the next task is due.
+                screen.wait_for_input(self.scheduler.get_idle_wait())
 
 
-    def get_input(self, screen: Screen) -> None:
+    #Handles a single input event, returns whether an event was handled.
+    def get_input(self, screen: Screen) -> bool:
         event = screen.get_event()
 
         if event == None or isinstance(event, MouseEvent):
-            return
+            return False
 
         key_code = event.key_code
 
@@ -63,7 +108,114 @@ class ConsoleEditor():
         elif key_code == 13:
             self.buffer.perform_linebreak()
         elif key_code == Screen.KEY_TAB:
-            self.buffer.add_tab(4)
+            self.buffer.add_tab(TAB_WIDTH)
+        elif key_code == Screen.KEY_ESCAPE:
+            if self.buffer.cancel_transform():
+                self.info_bar.set_current_text("Transform cancelled")
+
+            self.buffer.clear_extra_cursors()
+            self.buffer.clear_selection()
+
+        #Selection and clipboard.
+        elif key_code == KEY_SHIFT_LEFT:
+            self.buffer.select_move(CursorMoveDirection.LEFT)
+        elif key_code == KEY_SHIFT_RIGHT:
+            self.buffer.select_move(CursorMoveDirection.RIGHT)
+        elif key_code == KEY_SHIFT_UP:
+            self.buffer.select_move(CursorMoveDirection.UP)
+        elif key_code == KEY_SHIFT_DOWN:
+            self.buffer.select_move(CursorMoveDirection.DOWN)
+        elif key_code == Screen.ctrl("a"):
+            self.buffer.select_all()
+        elif key_code == Screen.ctrl("e"):
+            self.buffer.toggle_block_selection()
+        elif key_code == Screen.ctrl("g"):
+            if not self.buffer.select_to_next_match():
+                self.info_bar.set_current_text("No match after the cursor, use Ctrl+F to search")
+        elif key_code == Screen.ctrl("w"):
+            if self.buffer.copy_selection(self.clipboard):
+                self.info_bar.set_current_text(f"Copied {len(self.clipboard.lines)} line{'' if len(self.clipboard.lines) == 1 else 's'}")
+        elif key_code == Screen.ctrl("x"):
+            if self.buffer.cut_selection(self.clipboard):
+                self.info_bar.set_current_text(f"Cut {len(self.clipboard.lines)} line{'' if len(self.clipboard.lines) == 1 else 's'}")
+        elif key_code == Screen.ctrl("v"):
+            self.buffer.paste(self.clipboard)
+
+        #Folding.
+        elif key_code == Screen.ctrl("y"):
+            if not self.buffer.toggle_fold():
+                self.info_bar.set_current_text("Nothing to fold")
+        elif key_code == Screen.KEY_F2:
+            self.buffer.fold_all()
+        elif key_code == Screen.KEY_F3:
+            self.buffer.unfold_all()
+
+        #Diff against the file on disk.
+        elif key_code == Screen.KEY_F5:
+            self.info_bar.set_current_text(self.buffer.toggle_diff())
+        elif key_code == Screen.KEY_F6:
+            if not self.buffer.move_to_next_change():
+                self.info_bar.set_current_text("No change after the cursor")
+        elif key_code == Screen.KEY_F7:
+            if not self.buffer.move_to_previous_change():
+                self.info_bar.set_current_text("No change before the cursor")
+
+        #Bookmarks, named marks and the jump list.
+        elif key_code == Screen.KEY_F4:
+            self.info_bar.set_current_text("Bookmark set" if self.buffer.toggle_bookmark() else "Bookmark removed")
+        elif key_code == Screen.KEY_F10:
+            if not self.buffer.move_to_next_bookmark():
+                self.info_bar.set_current_text("No bookmarks, use F4 to set one")
+        elif key_code == Screen.KEY_F11:
+            name = self.input_prompt.get_input("Set mark: ")
+
+            if name:
+                self.buffer.set_mark(name)
+                self.info_bar.set_current_text(f"Mark \"{name}\" set")
+        elif key_code == Screen.KEY_F12:
+            name = self.input_prompt.get_input("Go to mark: ")
+
+            if name and not self.buffer.move_to_mark(name):
+                self.info_bar.set_current_text(f"No mark named \"{name}\"")
+        elif key_code == Screen.ctrl("u"):
+            if not self.buffer.jump_back():
+                self.info_bar.set_current_text("No previous position")
+        #Ctrl+S never reaches the editor, the terminal uses it to stop its output.
+        elif key_code == Screen.ctrl("]"):
+            if not self.buffer.jump_forward():
+                self.info_bar.set_current_text("No next position")
+
+        #Showing only the lines that match a regex.
+        elif key_code == Screen.KEY_F8:
+            regex = None if self.buffer.is_filter_enabled() else self.input_prompt.get_input("Filter: ")
+
+            if regex != None or self.buffer.is_filter_enabled():
+                result = self.buffer.toggle_filter(regex, self.scheduler, self.info_bar.set_current_text)
+                self.info_bar.set_current_text("Invalid regex" if result == None else result)
+
+        #Sorting, deduplicating and filtering the lines.
+        elif key_code == Screen.KEY_F9:
+            command = self.input_prompt.get_input("Transform (sort [-r] [-n] [REGEX], unique, reverse, keep REGEX, drop REGEX): ")
+
+            if command != None:
+                self.info_bar.set_current_text(self.buffer.transform_lines(command, self.scheduler, self.info_bar.set_current_text))
+
+        elif key_code == Screen.ctrl("n"):
+            if self.buffer.complete_word() == None:
+                self.info_bar.set_current_text("No completions")
+
+        #Multiple cursors.
+        elif key_code == Screen.ctrl("t"):
+            self.buffer.add_cursor_vertical(CursorMoveDirection.UP)
+        elif key_code == Screen.ctrl("b"):
+            self.buffer.add_cursor_vertical(CursorMoveDirection.DOWN)
+        elif key_code == Screen.ctrl("d"):
+            cursor_count = self.buffer.add_cursors_at_matches()
+
+            if cursor_count == 0:
+                self.info_bar.set_current_text("No matches to place cursors at, use Ctrl+F to search")
+            else:
+                self.info_bar.set_current_text(f"Placed {cursor_count} cursors")
 
         elif key_code == Screen.ctrl("o"):
             result = self.buffer.save_buffer(self.input_prompt, self.confirmation_prompt)
@@ -72,7 +224,7 @@ class ConsoleEditor():
                 self.info_bar.set_current_text(result)
 
         elif key_code == Screen.ctrl("r"):
-            result = self.buffer.load_buffer(self.input_prompt, self.confirmation_prompt)
+            result = self.buffer.load_buffer(self.input_prompt, self.confirmation_prompt, self.scheduler, self.info_bar.set_current_text)
 
             if result != None:
                 self.info_bar.set_current_text(result)
@@ -80,14 +232,18 @@ class ConsoleEditor():
         elif key_code == Screen.ctrl("q"):
             if self.buffer.get_dirty():
                 if self.confirmation_prompt.get_confirmation("Exit with unsaved changes?"):
-                    quit()
+                    self._quit()
             else:
-                quit()
+                self._quit()
 
         elif key_code == Screen.ctrl("f"):
-            regex = self.input_prompt.get_input("Find: ")
+            regex = self.input_prompt.get_input("Find: ", lambda query: self._schedule_search(screen, query))
+            self._cancel_search()
 
-            if regex != None:
+            #If the search was cancelled the highlighting of the live search is removed.
+            if regex == None:
+                self.buffer.clear_highlight()
+            else:
                 res = self.buffer.highlight_regex(regex)
 
                 if res == None:
@@ -124,7 +280,72 @@ class ConsoleEditor():
         else:
             raise Exception(key_code)
 
+        return True
+
+    #Reopens the file that was open when the editor was last closed, the cursor and the scroll are restored once it's loaded.
+    def _restore_session(self) -> None:
+        session = load_session()
+
+        if session == None or not os.path.isfile(session.filename):
+            return
+
+        def restore_position() -> None:
+            self.buffer.set_cursor_pos(session.cursor)
+            self.display.display_info.x_scroll = session.x_scroll
+            self.display.display_info.y_scroll = session.y_scroll
+
+        self.info_bar.set_current_text(self.buffer.open_file(session.filename, self.scheduler, self.info_bar.set_current_text,
+            restore_position))
+
+    #Starts the server that lets other programs use the buffer, its requests are run by the scheduler.
+    def _start_control_server(self) -> None:
+        #The server isn't needed for the first frame, nor at all unless it's enabled.
+        from utils.control_server import ControlServer, get_default_socket_path
+
+        socket_path = Config.get_config()["GENERAL CONFIG"]["control socket"]["socket path"] or get_default_socket_path()
+        control_server = ControlServer(self.buffer, self.scheduler, socket_path)
+        error = control_server.start()
+
+        if error != None:
+            self.info_bar.set_current_text(error)
+        else:
+            self._control_server = control_server
+
+    #Closes the editor, storing the session if sessions are restored.
+    def _quit(self) -> None:
+        if self._control_server != None:
+            self._control_server.close()
+
+        filename = self.buffer.get_filename()
+
+        if Config.get_config()["GENERAL CONFIG"]["session"]["restore session"] and filename != None:
+            save_session(Session(os.path.abspath(filename), self.buffer.get_cursor_pos(), self.display.display_info.x_scroll,
+                self.display.display_info.y_scroll))
+
+        quit()
+
+    #Schedules a search for the given query to be performed once the user stops typing, replacing any search still pending.
+    def _schedule_search(self, screen: Screen, query: str) -> None:
+        self._cancel_search()
+        self._search_task = self.scheduler.schedule(SEARCH_DEBOUNCE, lambda: self._live_search(screen, query))
+
+    def _cancel_search(self) -> None:
+        if self._search_task != None:
+            self._search_task.cancel()
+            self._search_task = None
+
+    #Highlights the matches of the query while it's being typed, the input prompt is drawn on top afterwards.
+    def _live_search(self, screen: Screen, query: str) -> None:
+        self._search_task = None
+
+        #Incomplete queries are often invalid regexes, in that case nothing is highlighted.
+        if query == "" or self.buffer.highlight_regex(query) == None:
+            self.buffer.clear_highlight()
+
+        self.display.display_to_screen(screen)
+
 
 
-editor = ConsoleEditor()
-editor.console_editor()
\ No newline at end of file
+if __name__ == "__main__":
+    editor = ConsoleEditor()
+    editor.console_editor()
\ No newline at end of file
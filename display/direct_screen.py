@@ -0,0 +1,316 @@
+from asciimatics.screen import Screen
+import os
+import sys
+from typing import BinaryIO, Optional
+
+from utils.columns import get_char_width
+
+
+#The largest scroll that is looked for between frames, as a fraction of the height of the screen.
+MAX_SCROLL_FRACTION = 0.5
+#Unchanged cells between two changed ones that are written again instead of moving the cursor over them, moving takes at least 3 bytes.
+MAX_REWRITTEN_GAP = 3
+
+#Blank cells at the end of a row from which the rest of the row is erased instead of written.
+MIN_ERASED_LENGTH = 4
+
+#Escape sequences.
+CSI = "\x1b["
+RESET_SCROLL_REGION = "\x1b[r"
+#Erases from the cursor to the end of the row, with the current background colour.
+ERASE_LINE_END = "\x1b[K"
+
+
+#Returns the parameters of the SGR sequence that sets the colours and attribute of a style.
+def _get_style_parameters(fg: int, attr: int, bg: int) -> str:
+    parameters = ["0"]
+
+    if attr == Screen.A_BOLD:
+        parameters.append("1")
+    elif attr == Screen.A_REVERSE:
+        parameters.append("7")
+    elif attr == Screen.A_UNDERLINE:
+        parameters.append("4")
+
+    for (colour, base, default) in ((fg, 30, "39"), (bg, 40, "49")):
+        if colour < 0:
+            parameters.append(default)
+        elif colour < 8:
+            parameters.append(str(base + colour))
+        elif colour < 16:
+            parameters.append(str(base + 60 + colour - 8))
+        else:
+            parameters.append(f"{base + 8};5;{colour}")
+
+    return ";".join(parameters)
+
+
+#Draws to the terminal by itself instead of through the asciimatics screen, it takes the screen's place: it offers the drawing methods the
+#editor uses and passes input on to the screen it wraps, which keeps managing the terminal.
+#
+#The frame is drawn to a grid of cells, on refresh it's compared with the previous frame and only the differences are written. The cursor is
+#moved with the shortest sequence that gets it where it needs to be, short gaps of unchanged cells are written again instead, and the colours
+#are only set when they change from the last cell written. When most of the frame is the previous one moved up or down, as when scrolling
+#through the buffer, the terminal is told to scroll that part of the screen and only the rows that scrolled in are written. Everything is
+#sent to the terminal in a single write per frame.
+class DirectScreen:
+    def __init__(self, screen: Screen, output: Optional[BinaryIO] = None) -> None:
+        self._screen = screen
+        self._output = output if output != None else sys.stdout.buffer
+        self.dimensions = screen.dimensions
+        (height, width) = self.dimensions
+
+        #The text and style of each cell. A wide character takes up two cells, the second one is empty. The style is the parameters of the
+        #sequence that sets it, so styles that look the same are the same.
+        self._chars = [[" "] * width for _ in range(height)]
+        self._styles = [[""] * width for _ in range(height)]
+        #What the terminal shows, "None" for rows that are unknown and have to be written fully.
+        self._shown_chars: list[Optional[list[str]]] = [None] * height
+        self._shown_styles: list[Optional[list[str]]] = [None] * height
+
+        #The position of the terminal's cursor and the style set, "None" when they aren't known.
+        self._cursor: Optional[tuple[int, int]] = None
+        self._style: Optional[str] = None
+        self._style_parameters: dict[tuple[int, int, int], str] = {}
+
+    #Input is handled by the wrapped screen.
+    def get_event(self):
+        return self._screen.get_event()
+
+    def wait_for_input(self, timeout: float) -> None:
+        self._screen.wait_for_input(timeout)
+
+    #Same as "Screen.print_at". Characters past the edges of the screen are left out.
+    def print_at(self, text: str, x: int, y: int, colour: int = 7, attr: int = 0, bg: int = 0, transparent: bool = False) -> None:
+        (height, width) = self.dimensions
+
+        if not 0 <= y < height:
+            return
+
+        chars = self._chars[y]
+        styles = self._styles[y]
+        style = self._get_style(colour, attr, bg)
+
+        for char in text:
+            char_width = 1 if char.isascii() else get_char_width(char)
+
+            #Combining characters are left out, the editor draws them as part of the previous character.
+            if char_width == 0:
+                continue
+            if x >= width:
+                break
+
+            if x >= 0 and x + char_width <= width and not (transparent and char == " "):
+                #Overwriting half of a wide character leaves the other half blank.
+                if chars[x] == "" and x > 0:
+                    chars[x - 1] = " "
+                if x + char_width < width and chars[x + char_width] == "":
+                    chars[x + char_width] = " "
+
+                chars[x] = char
+                styles[x] = style
+
+                if char_width == 2:
+                    chars[x + 1] = ""
+                    styles[x + 1] = style
+
+            x += char_width
+
+    #Same as "Screen.clear_buffer".
+    def clear_buffer(self, fg: int, attr: int, bg: int, x: int = 0, y: int = 0, w: Optional[int] = None, h: Optional[int] = None) -> None:
+        (height, width) = self.dimensions
+        style = self._get_style(fg, attr, bg)
+        end_x = width if w == None else min(x + w, width)
+
+        for row in range(max(y, 0), height if h == None else min(y + h, height)):
+            chars = self._chars[row]
+
+            #A wide character cut in half by the box is blanked.
+            if x > 0 and chars[x] == "":
+                chars[x - 1] = " "
+            if end_x < width and chars[end_x] == "":
+                chars[end_x] = " "
+
+            chars[x:end_x] = [" "] * (end_x - x)
+            self._styles[row][x:end_x] = [style] * (end_x - x)
+
+    #Writes the differences with the previous frame to the terminal.
+    def refresh(self) -> None:
+        self._output_parts: list[str] = []
+
+        self._scroll()
+
+        for y in range(self.dimensions[0]):
+            if self._chars[y] != self._shown_chars[y] or self._styles[y] != self._shown_styles[y]:
+                self._write_row(y)
+                #The shown rows are copies, the frame keeps being drawn on the grid.
+                self._shown_chars[y] = self._chars[y][:]
+                self._shown_styles[y] = self._styles[y][:]
+
+        if self._output_parts:
+            self._write("".join(self._output_parts).encode("utf-8"))
+
+    #Makes every row be written fully on the next refresh, for when something else drew on the terminal.
+    def invalidate(self) -> None:
+        self._shown_chars = [None] * self.dimensions[0]
+        self._shown_styles = [None] * self.dimensions[0]
+        self._cursor = None
+        self._style = None
+
+    #Returns the style of the colours and attribute, they are kept so the sequence is only built once.
+    def _get_style(self, fg: int, attr: int, bg: int) -> str:
+        style = self._style_parameters.get((fg, attr, bg))
+
+        if style == None:
+            style = self._style_parameters[(fg, attr, bg)] = _get_style_parameters(fg, attr, bg)
+
+        return style
+
+    #If part of the frame is the previous one moved up or down, scrolls that part of the terminal.
+    def _scroll(self) -> None:
+        (height, width) = self.dimensions
+        new_rows = [(tuple(chars), tuple(styles)) for (chars, styles) in zip(self._chars, self._styles)]
+        shown_rows = [None if chars == None else (tuple(chars), tuple(styles))
+            for (chars, styles) in zip(self._shown_chars, self._shown_styles)]
+        best = None
+        best_gain = 1
+
+        #For each distance, the rows that would be right after scrolling are compared with the rows that are already right, within the
+        #region that would be scrolled.
+        for distance in range(1, int(height * MAX_SCROLL_FRACTION) + 1):
+            for direction in (1, -1):
+                offset = distance * direction
+                matches = [y for y in range(max(0, -offset), min(height, height - offset))
+                    if new_rows[y] == shown_rows[y + offset] and shown_rows[y + offset] != None]
+
+                if len(matches) <= best_gain:
+                    continue
+
+                (top, bottom) = (min(matches[0], matches[0] + offset), max(matches[-1], matches[-1] + offset))
+                gain = len(matches) - sum(1 for y in range(top, bottom + 1) if new_rows[y] == shown_rows[y])
+
+                if gain > best_gain:
+                    (best, best_gain) = ((top, bottom, offset), gain)
+
+        if best == None:
+            return
+
+        (top, bottom, offset) = best
+        #Scrolling up moves the rows up, the region is scrolled by the distance and the rows that scroll in are blank.
+        self._output_parts.append(f"{CSI}{top + 1};{bottom + 1}r{CSI}{abs(offset)}{'S' if offset > 0 else 'T'}{RESET_SCROLL_REGION}")
+        #Setting the scroll region moves the cursor to the top left corner.
+        self._cursor = (0, 0)
+
+        region_chars = self._shown_chars[top:bottom + 1]
+        region_styles = self._shown_styles[top:bottom + 1]
+        blank = [None] * abs(offset)
+
+        if offset > 0:
+            self._shown_chars[top:bottom + 1] = region_chars[offset:] + blank
+            self._shown_styles[top:bottom + 1] = region_styles[offset:] + blank
+        else:
+            self._shown_chars[top:bottom + 1] = blank + region_chars[:offset]
+            self._shown_styles[top:bottom + 1] = blank + region_styles[:offset]
+
+    #Writes the cells of the row that differ from what's shown, the whole row if it isn't known.
+    def _write_row(self, y: int) -> None:
+        width = self.dimensions[1]
+        chars = self._chars[y]
+        styles = self._styles[y]
+        shown_chars = self._shown_chars[y]
+        shown_styles = self._shown_styles[y]
+        x = 0
+
+        while x < width:
+            if shown_chars != None and chars[x] == shown_chars[x] and styles[x] == shown_styles[x]:
+                x += 1
+                continue
+
+            #A run of changed cells, it goes on over short gaps of unchanged ones.
+            start = x
+            end = x + 1
+            gap = 0
+
+            while end + gap < width and gap <= MAX_REWRITTEN_GAP:
+                if shown_chars == None or chars[end + gap] != shown_chars[end + gap] or styles[end + gap] != shown_styles[end + gap]:
+                    end += gap + 1
+                    gap = 0
+                else:
+                    gap += 1
+
+            #The run has to start at the first half of a wide character.
+            while start > 0 and chars[start] == "":
+                start -= 1
+
+            self._write_run(start, end, y)
+            x = end
+
+    def _write_run(self, start: int, end: int, y: int) -> None:
+        width = self.dimensions[1]
+        chars = self._chars[y]
+        styles = self._styles[y]
+        write_end = end
+
+        #Blank cells up to the end of the row are erased.
+        if end == width:
+            while write_end > start and chars[write_end - 1] == " " and styles[write_end - 1] == styles[-1]:
+                write_end -= 1
+
+            if width - write_end < MIN_ERASED_LENGTH:
+                write_end = width
+
+        self._move_cursor(start, y)
+
+        for x in range(start, write_end):
+            #The second half of a wide character.
+            if chars[x] == "":
+                continue
+
+            self._set_style(styles[x])
+            self._output_parts.append(chars[x])
+
+        if write_end < end:
+            self._set_style(styles[-1])
+            self._output_parts.append(ERASE_LINE_END)
+            self._cursor = (write_end, y)
+        else:
+            end_x = end + (1 if end < width and chars[end] == "" else 0)
+            #After writing the last column the cursor's position depends on the terminal.
+            self._cursor = (end_x, y) if end_x < width else None
+
+    def _set_style(self, style: str) -> None:
+        if style != self._style:
+            self._output_parts.append(f"{CSI}{style}m")
+            self._style = style
+
+    #Moves the cursor using the shortest sequence.
+    def _move_cursor(self, x: int, y: int) -> None:
+        if self._cursor == (x, y):
+            return
+
+        options = [f"{CSI}{y + 1}H" if x == 0 else f"{CSI}{y + 1};{x + 1}H"]
+
+        if self._cursor != None:
+            (cursor_x, cursor_y) = self._cursor
+
+            if cursor_y == y:
+                if x == 0:
+                    options.append("\r")
+                elif x > cursor_x:
+                    options.append(f"{CSI}{x - cursor_x}C" if x - cursor_x > 1 else f"{CSI}C")
+                else:
+                    options.append(f"{CSI}{cursor_x - x}D" if cursor_x - x > 1 else "\b")
+            #The cursor isn't on the last row, so a line feed doesn't scroll.
+            elif cursor_y + 1 == y:
+                options.append("\n" if x == cursor_x else "\r\n" if x == 0 else None)
+
+        self._output_parts.append(min((option for option in options if option != None), key = len))
+        self._cursor = (x, y)
+
+    #Writes the bytes to the terminal, in a single call unless the terminal takes them in parts.
+    def _write(self, data: bytes) -> None:
+        view = memoryview(data)
+
+        while view:
+            written = os.write(self._output.fileno(), view)
+            view = view[written:]
\ No newline at end of file
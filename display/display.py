@@ -4,6 +4,7 @@ from math import log10
 from typing import Optional
 
 from buffer.buffer import Buffer
+from utils.columns import column_to_index, get_column_starts, index_to_column
 from utils.info_bar import InfoBar
 from utils.point import Point
 
@@ -13,7 +14,8 @@ from configuration.config import Config
 #This class contains configuration info pertaining to the buffer display. The X and Y end subtract from the total height or width respectively.
 #For example, if "y_end" is (-2) that means that the Y size of the buffer will be the total height of the console window minus 2. The scroll
 #indicates what part of the buffer is visible based on the position of the cursor. The width of the line number is the width of the longest
-#line number, it's used to set x_start and to print the line numbers.
+#line number, it's used to set x_start and to print the line numbers. The Y scroll is in rows, lines hidden by folds don't take up a row.
+#When the diff view is enabled a column after the line numbers shows the diff markers.
 @dataclass
 class DisplayInfo:
     x_start = 0
@@ -56,34 +58,36 @@ class Display():
     #Calculates how many characters are required to display the maximum number of lines.
     def calculate_x_start(self) -> None:
         self.display_info.line_number_width = max(int(log10(self.buffer.get_length())) + 1, 2)
-        self.display_info.x_start = self.display_info.line_number_width
+        self.display_info.x_start = self.display_info.line_number_width + (1 if self.buffer.is_diff_enabled() else 0)
 
     #Handles the horizontal and vertical scroll for printing the appropriate part of the buffer depending on the position of the cursor. 
     def scroll_handler(self, screen: Screen) -> None:
         end_x = screen.dimensions[1] + self.display_info.x_end
         end_y = screen.dimensions[0] + self.display_info.y_end
         cursor_pos = self.buffer.get_cursor_pos()
+        cursor_row = self.buffer.line_to_row(cursor_pos.y)
+        cursor_column = index_to_column(self.buffer.get_line(cursor_pos.y).data, cursor_pos.x)
 
         #First we check if the cursor has gone beneath the printed part of the buffer. For this we check the Y position of the cursor against
         #the final size of the printed buffer, "end_y", added to the current Y scroll minus 1, to account for the index. In case it's true we
         #set the scroll to be enough so the cursor appears on the last line.
-        if cursor_pos.y > end_y + self.display_info.y_scroll - 1:
-            self.display_info.y_scroll = cursor_pos.y - end_y + 1
+        if cursor_row > end_y + self.display_info.y_scroll - 1:
+            self.display_info.y_scroll = cursor_row - end_y + 1
         #If the cursor goes above the printed part of the buffer we set the scroll to the cursor's position, which is just enough for the
         #cursor to appear on the first line.
-        elif cursor_pos.y < self.display_info.y_scroll:
-            self.display_info.y_scroll = cursor_pos.y
+        elif cursor_row < self.display_info.y_scroll:
+            self.display_info.y_scroll = cursor_row
 
         #Same concept except in the X axis, except that we also take into account the fact that "start_x" can be not zero, when the line
-        #numbers are enabled.
-        if cursor_pos.x > end_x - self.display_info.x_start + self.display_info.x_scroll - 1:
-            self.display_info.x_scroll = cursor_pos.x - end_x + self.display_info.x_start + 1 
+        #numbers are enabled. The X scroll is in columns, so the cursor's column is used.
+        if cursor_column > end_x - self.display_info.x_start + self.display_info.x_scroll - 1:
+            self.display_info.x_scroll = cursor_column - end_x + self.display_info.x_start + 1
         #If the cursor goes above the printed part of the buffer we set the scroll to the cursor's position, which is just enough for the
         #cursor to appear on the first line.
-        elif cursor_pos.x < self.display_info.x_scroll:
-            self.display_info.x_scroll = cursor_pos.x
+        elif cursor_column < self.display_info.x_scroll:
+            self.display_info.x_scroll = cursor_column
 
-    #Displays the buffer according to the scroll.
+    #Displays the buffer according to the scroll. The X scroll is in columns, tabs and wide characters take up more than one column.
     def display_buffer(self, screen: Screen) -> None:
         display_y = self.display_info.y_start
 
@@ -94,16 +98,23 @@ class Display():
         normal_bg = self.colours["text"]["bg"]
         highlighted_fg = self.colours["highlight"]["fg"]
         highlighted_bg = self.colours["highlight"]["bg"]
+        selected_fg = self.colours["selection"]["fg"]
+        selected_bg = self.colours["selection"]["bg"]
 
-        #We iterate through every line between the scroll and the end of the buffer, we do the same in each line with the characters. Every
+        #We iterate through every row between the scroll and the end of the buffer, we do the same in each line with the characters. Every
         #iteration we check if the printing indexes we are using have exceeded the ones specified in the buffer configuration to avoid printing
         #out of bounds.
-        for y in range(self.display_info.y_scroll, self.buffer.get_length()):
-            display_x = self.display_info.x_start
+        for row in range(self.display_info.y_scroll, self.buffer.get_row_count()):
+            y = self.buffer.row_to_line(row)
             current_line = self.buffer.get_line(y)
+            selected_columns = self.buffer.get_selected_columns(y)
+            column_starts = get_column_starts(current_line.data)
+
+            #Avoids unnecessary checks if every character takes up a single column and there are no highlighted or selected sections on the
+            #line.
+            if column_starts == None and current_line.highlight == None and selected_columns == None:
+                display_x = self.display_info.x_start
 
-            #Avoids unnecessary checks if there are no highlighted sections on the line.
-            if current_line.highlight == None:
                 for x in range(self.display_info.x_scroll, len(current_line.data)):
                     screen.print_at(current_line.data[x], display_x, display_y,
                         colour = normal_fg, bg = normal_bg)
@@ -113,40 +124,65 @@ class Display():
                     if display_x >= end_x:
                         break
             else:
-                for x in range(self.display_info.x_scroll, len(current_line.data)):
-                    if x in current_line.highlight:
+                #The first character is found with a binary search, it may start before the scroll if it's wider than one column.
+                for x in range(column_to_index(current_line.data, self.display_info.x_scroll), len(current_line.data)):
+                    if selected_columns != None and selected_columns[0] <= x < selected_columns[1]:
+                        fg_colour = selected_fg
+                        bg_colour = selected_bg
+                    elif current_line.highlight != None and x in current_line.highlight:
                         fg_colour = highlighted_fg
                         bg_colour = highlighted_bg
                     else:
                         fg_colour = normal_fg
                         bg_colour = normal_bg
 
-                    screen.print_at(current_line.data[x], display_x, display_y,
-                        colour = fg_colour, bg = bg_colour)
+                    (column, width) = (x, 1) if column_starts == None else (column_starts[x], column_starts[x + 1] - column_starts[x])
+                    display_x = column - self.display_info.x_scroll + self.display_info.x_start
 
                     #X printing index check.
-                    display_x += 1
                     if display_x >= end_x:
                         break
 
+                    self._print_char(screen, current_line.data[x], display_x, width, display_y, fg_colour, bg_colour)
+
             #Y printing index check.
             display_y += 1
             if display_y > end_y:
                 break
 
-    #Displays the cursor.
-    def display_cursor(self, screen: Screen) -> None:
-        cursor_pos = self.buffer.get_cursor_pos()
-        current_line_data = self.buffer.get_line(cursor_pos.y).data
+    #Prints a character that takes up "width" columns. Tabs are shown as spaces, as are wide characters that are partly scrolled out of view.
+    def _print_char(self, screen: Screen, char: str, display_x: int, width: int, display_y: int, fg_colour: int, bg_colour: int) -> None:
+        #Combining characters are drawn along with the previous character.
+        if width == 0:
+            return
 
-        #Check whether the cursor is at the end of the line and change it's colour appropriately.
-        if cursor_pos.x > len(current_line_data) - 1:
-            screen.print_at(" ", cursor_pos.x + self.display_info.x_start, cursor_pos.y - self.display_info.y_scroll,
-                bg = self.colours["cursor"]["bg"])
+        if char == "\t" or display_x < self.display_info.x_start:
+            visible_x = max(display_x, self.display_info.x_start)
+            screen.print_at(" " * (display_x + width - visible_x), visible_x, display_y, colour = fg_colour, bg = bg_colour)
         else:
-            screen.print_at(current_line_data[cursor_pos.x], cursor_pos.x + self.display_info.x_start - self.display_info.x_scroll,
-                cursor_pos.y - self.display_info.y_scroll, colour = self.colours["cursor"]["fg"],
-                bg = self.colours["cursor"]["bg"])
+            screen.print_at(char, display_x, display_y, colour = fg_colour, bg = bg_colour)
+
+    #Displays the cursor, and the extra cursors that are on screen.
+    def display_cursor(self, screen: Screen) -> None:
+        end_y = screen.dimensions[0] + self.display_info.y_end
+        #The lines shown on screen.
+        first_line = self.buffer.row_to_line(self.display_info.y_scroll)
+        last_row = min(self.display_info.y_scroll + end_y, self.buffer.get_row_count()) - 1
+        end_line = self.buffer.row_to_line(last_row) + 1
+
+        for extra_pos in self.buffer.get_extra_cursor_positions(first_line, end_line):
+            self._print_cursor(screen, extra_pos)
+
+        self._print_cursor(screen, self.buffer.get_cursor_pos())
+
+    #Prints a cursor over the character at the given position, or as a blank space at the end of the line. Tabs are shown as a single space.
+    def _print_cursor(self, screen: Screen, pos: Point) -> None:
+        line_data = self.buffer.get_line(pos.y).data
+        char = line_data[pos.x] if pos.x < len(line_data) and line_data[pos.x] != "\t" else " "
+
+        screen.print_at(char, index_to_column(line_data, pos.x) + self.display_info.x_start - self.display_info.x_scroll,
+            self.buffer.line_to_row(pos.y) - self.display_info.y_scroll, colour = self.colours["cursor"]["fg"],
+            bg = self.colours["cursor"]["bg"])
 
     #If the cursor is on top of a brace shows the matching opening/closing brace.
     def display_matching_brace(self, screen: Screen) -> None:
@@ -156,10 +192,16 @@ class Display():
         if matching_brace_pos == None:
             return
 
+        #The matching brace is in a line hidden by a fold.
+        match_row = self.buffer.line_to_row(matching_brace_pos.y)
+        if self.buffer.row_to_line(match_row) != matching_brace_pos.y:
+            return
+
         #It does not matter if the match was found outside of screen bounds, printing to a non visible location does nothing.
         match_line = self.buffer.get_line(matching_brace_pos.y).data
-        screen.print_at(match_line[matching_brace_pos.x], matching_brace_pos.x + self.display_info.x_start,
-                matching_brace_pos.y - self.display_info.y_scroll, colour = self.colours["matching brace"]["fg"],
+        screen.print_at(match_line[matching_brace_pos.x],
+                index_to_column(match_line, matching_brace_pos.x) + self.display_info.x_start - self.display_info.x_scroll,
+                match_row - self.display_info.y_scroll, colour = self.colours["matching brace"]["fg"],
                 bg = self.colours["matching brace"]["bg"])
 
     #Gets the position of the matching opening/closing brace.
@@ -206,18 +248,38 @@ class Display():
         return None
 
 
-    #Displays the line numbers.
+    #Displays the line numbers, the numbers of bookmarked lines and of the lines that are fold headers are shown in different colours. The
+    #diff markers are shown after them.
     def display_line_nums(self, screen: Screen) -> None:
-        line_count = self.buffer.get_length()
+        row_count = self.buffer.get_row_count()
+        end_row = min(self.display_info.y_scroll + screen.dimensions[0] + self.display_info.y_end, row_count)
+        diff_markers = {}
+        bookmarked_lines = set()
+
+        if self.display_info.y_scroll < end_row:
+            (first_line, end_line) = (self.buffer.row_to_line(self.display_info.y_scroll), self.buffer.row_to_line(end_row - 1) + 1)
+            diff_markers = self.buffer.get_diff_markers(first_line, end_line)
+            bookmarked_lines = self.buffer.get_bookmarked_lines(first_line, end_line)
 
         for y in range(self.display_info.y_start, screen.dimensions[0] + self.display_info.y_end):
-            line_number = y + self.display_info.y_scroll + 1
+            row = y + self.display_info.y_scroll
+
+            #if the row exists in the buffer print the number of its line with the appropriate amount of padding.
+            if row < row_count:
+                line = self.buffer.row_to_line(row)
+                if line in bookmarked_lines:
+                    (fg, bg) = (self.colours["bookmark"]["fg"], self.colours["bookmark"]["bg"])
+                elif self.buffer.is_fold_header(line):
+                    (fg, bg) = (self.colours["fold"]["fg"], self.colours["fold"]["bg"])
+                else:
+                    (fg, bg) = (Screen.COLOUR_BLACK, Screen.COLOUR_WHITE)
 
-            #if the number exists in the buffer print it with the appropriate amount of padding.
-            if line_number <= line_count:
                 #The ">" indicates that "line_number" must be right-aligned with the width of "self.display_info.line_number_width".
-                screen.print_at(f"{line_number:>{self.display_info.line_number_width}}", 0, y, colour = Screen.COLOUR_BLACK,
-                    bg = Screen.COLOUR_WHITE)
+                screen.print_at(f"{line + 1:>{self.display_info.line_number_width}}", 0, y, colour = fg, bg = bg)
+
+                if line in diff_markers:
+                    screen.print_at(diff_markers[line], self.display_info.line_number_width, y,
+                        colour = self.colours["diff"][diff_markers[line]], bg = Screen.COLOUR_BLACK)
             else:
                 screen.print_at("~", 0, y)
 
@@ -227,10 +289,12 @@ class Display():
         #Note the use of single quotes, inside the f-string.
         filename = self.buffer.get_filename() if self.buffer.get_filename() != None else "[No filename]"
         modified = "(modified)" if self.buffer.get_dirty() else ""
-        left_text = f"{filename} - {buffer_length} line{('' if buffer_length == 1 else 's')} {modified}"
+        filtered = "[filtered]" if self.buffer.is_filter_enabled() else ""
+        left_text = f"{filename} - {buffer_length} line{('' if buffer_length == 1 else 's')} {modified} {filtered}"
 
         cursor_pos = self.buffer.get_cursor_pos()
-        right_text = f"{cursor_pos.x},{cursor_pos.y} "
+        cursor_count = self.buffer.get_cursor_count()
+        right_text = f"{f'{cursor_count} cursors - ' if cursor_count > 1 else ''}{cursor_pos.x},{cursor_pos.y} "
 
         #Note the use of single quotes, inside the f-string.
         final_string = f"{left_text}{' ' * (screen.dimensions[1] - len(left_text) - len(right_text))}{right_text}"
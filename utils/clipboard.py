@@ -0,0 +1,17 @@
+from dataclasses import dataclass, field
+
+
+#Holds the copied text as a list of lines, the lines are references to the strings of the buffer they were copied from, so copying a large
+#region doesn't copy its text. Strings can't be modified, so later edits to the buffer don't affect the clipboard. A block clipboard holds a
+#rectangular region, each line is pasted on its own line at the same column.
+@dataclass
+class Clipboard:
+    lines: list[str] = field(default_factory = list)
+    block: bool = False
+
+    def set_content(self, lines: list[str], block: bool) -> None:
+        self.lines = lines
+        self.block = block
+
+    def is_empty(self) -> bool:
+        return not self.lines
\ No newline at end of file
@@ -0,0 +1,77 @@
+from array import array
+from bisect import bisect_right
+from functools import lru_cache
+from itertools import accumulate
+from typing import Optional
+from unicodedata import combining, east_asian_width
+
+
+#Tabs move to the next column that is a multiple of the tab width.
+TAB_WIDTH = 4
+#Amount of lines whose column starts are kept. The cache is keyed by the text of the line, a modified line is a new string, so the entries of
+#modified lines are never used again and are eventually dropped.
+COLUMN_CACHE_SIZE = 4096
+
+
+#Returns the amount of columns the character takes up when it isn't a tab. Combining characters are drawn over the previous character, wide
+#characters take up two columns.
+@lru_cache(maxsize = 4096)
+def get_char_width(char: str) -> int:
+    if combining(char):
+        return 0
+    if east_asian_width(char) in ("W", "F"):
+        return 2
+
+    return 1
+
+
+#Returns the column each character of the line starts at, with the width of the line at the end. Returns "None" if every character takes up a
+#single column, which is the case for most lines, the index of each character is then its column.
+@lru_cache(maxsize = COLUMN_CACHE_SIZE)
+def get_column_starts(line: str) -> Optional[array]:
+    if line.isascii() and "\t" not in line:
+        return None
+
+    starts = array("l", [0])
+
+    #The width of a tab depends on where it starts, the text between tabs is summed all at once.
+    for (index, segment) in enumerate(line.split("\t")):
+        if index > 0:
+            starts.append(starts[-1] + TAB_WIDTH - starts[-1] % TAB_WIDTH)
+
+        starts.extend(accumulate(map(get_char_width, segment), initial = starts[-1]))
+        #The start of the segment was already in the array.
+        starts.pop(-len(segment) - 1)
+
+    return starts
+
+
+#Returns the column the character at "index" starts at, positions past the end of the line take up a column each.
+def index_to_column(line: str, index: int) -> int:
+    starts = get_column_starts(line)
+
+    if starts == None:
+        return index
+    if index >= len(line):
+        return starts[-1] + index - len(line)
+
+    return starts[index]
+
+
+#Returns the index of the character that covers the given column, the inverse of "index_to_column".
+def column_to_index(line: str, column: int) -> int:
+    starts = get_column_starts(line)
+
+    if starts == None:
+        return column
+    if column >= starts[-1]:
+        return len(line) + column - starts[-1]
+
+    return bisect_right(starts, column) - 1
+
+
+#Returns the amount of columns the line takes up.
+def get_line_width(line: str) -> int:
+    starts = get_column_starts(line)
+
+    return len(line) if starts == None else starts[-1]
\ No newline at end of file
@@ -0,0 +1,83 @@
+import bz2
+from dataclasses import dataclass
+import gzip
+import io
+import lzma
+import os.path
+import zlib
+from typing import BinaryIO, Optional, TextIO
+
+
+#Magic numbers at the start of the files of each compression format.
+MAGIC_NUMBERS = {"gzip": b"\x1f\x8b", "bz2": b"BZh", "xz": b"\xfd7zXZ\x00"}
+#Extensions used to pick the compression of new files.
+EXTENSIONS = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz"}
+#Level used when the level of a file can't be known from its header, it's the default level of each library.
+DEFAULT_LEVELS = {"gzip": 6, "bz2": 9, "xz": 6}
+
+
+#Errors that can be raised while reading a file, corrupted compressed data raises them partway through.
+READ_ERRORS = (OSError, EOFError, UnicodeDecodeError, lzma.LZMAError, zlib.error)
+
+
+#The compression format of a file and the level it was compressed with.
+@dataclass
+class Compression:
+    format: str
+    level: int
+
+
+#Returns the compression of the file from its magic number, or "None" if it isn't compressed. The file is left at its start.
+def detect_compression(file: BinaryIO) -> Optional[Compression]:
+    header = file.read(10)
+    file.seek(0)
+
+    for (format, magic_number) in MAGIC_NUMBERS.items():
+        if header.startswith(magic_number):
+            return Compression(format, _get_level(format, header))
+
+    return None
+
+
+#Returns the compression a new file should use according to its extension, or "None" if it shouldn't be compressed.
+def get_compression_for_filename(filename: str) -> Optional[Compression]:
+    format = EXTENSIONS.get(os.path.splitext(filename)[1].lower())
+
+    return None if format == None else Compression(format, DEFAULT_LEVELS[format])
+
+
+#Returns a text stream that decompresses the file as it's read.
+def open_text_reader(file: BinaryIO, compression: Optional[Compression]) -> TextIO:
+    match None if compression == None else compression.format:
+        case "gzip":
+            return gzip.open(file, "rt")
+        case "bz2":
+            return bz2.open(file, "rt")
+        case "xz":
+            return lzma.open(file, "rt")
+        case _:
+            return io.TextIOWrapper(file)
+
+
+#Opens the file for writing text, compressing it as it's written.
+def open_text_writer(filename: str, compression: Optional[Compression]) -> TextIO:
+    match None if compression == None else compression.format:
+        case "gzip":
+            return gzip.open(filename, "wt", compresslevel = compression.level)
+        case "bz2":
+            return bz2.open(filename, "wt", compresslevel = compression.level)
+        case "xz":
+            return lzma.open(filename, "wt", preset = compression.level)
+        case _:
+            return open(filename, "w")
+
+
+#Gets the compression level from the header. Gzip only marks the fastest and the best levels, bzip2 stores its block size, which is its
+#level, xz doesn't store the preset.
+def _get_level(format: str, header: bytes) -> int:
+    if format == "gzip" and len(header) > 8:
+        return {2: 9, 4: 1}.get(header[8], DEFAULT_LEVELS[format])
+    if format == "bz2" and len(header) > 3 and chr(header[3]) in "123456789":
+        return int(chr(header[3]))
+
+    return DEFAULT_LEVELS[format]
\ No newline at end of file
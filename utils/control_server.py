@@ -0,0 +1,302 @@
+import asyncio
+from concurrent.futures import Future
+import json
+import os
+import os.path
+import socket
+import tempfile
+from threading import Thread
+from typing import Any, Awaitable, Callable, Optional
+
+from buffer.buffer import Buffer
+from utils.point import Point
+from utils.scheduler import Scheduler
+
+
+#Amount of lines sent in each chunk of a read.
+READ_CHUNK_LINES = 1000
+#Maximum amount of matches returned by a search.
+MAX_SEARCH_MATCHES = 10000
+#Maximum length of a request, requests are single lines of JSON.
+MAX_REQUEST_LENGTH = 1 << 24
+
+#JSON-RPC error codes.
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+SERVER_ERROR = -32000
+
+
+#Returns the path of the socket used when none is configured, it's private to the user.
+def get_default_socket_path() -> str:
+    return os.path.join(os.environ.get("XDG_RUNTIME_DIR", tempfile.gettempdir()), f"console_editor-{os.getuid()}.sock")
+
+
+#An error to be sent back as the response to a request.
+class RpcError(Exception):
+    def __init__(self, code: int, message: str) -> None:
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+#Lets other programs on the machine query and edit the buffer through a Unix domain socket, using JSON-RPC 2.0 with a request or response on
+#each line. The server runs an asyncio loop on its own thread, but the buffer is only touched by the main loop: every operation is scheduled
+#in the scheduler and the server waits for its result, so operations are applied between frames and the editor never blocks on a client.
+#
+#Reads are streamed, the lines are taken from the buffer in a single operation, which only copies references, and sent in chunks of
+#"READ_CHUNK_LINES" as "read.chunk" notifications before the response. Encoding them happens on the server's thread.
+#
+#Methods, positions are objects with a "line" and a "character" index:
+#   info                                    Returns the filename, line count, whether it's modified and the cursor position.
+#   read {start, end}                       Streams the lines between "start" and "end", "end" not included, returns the line count.
+#   edit {edits: [{start, end, text}]}      Replaces the text of each range, the ranges are taken before any edit and can't overlap.
+#   search {regex}                          Returns the matches as {line, start, end} objects.
+#   highlight {ranges: [{line, start, end}], clear}
+#                                           Highlights the ranges, removing the previous highlighting if "clear" is set.
+#   save                                    Saves the buffer to its file.
+class ControlServer:
+    def __init__(self, buffer: Buffer, scheduler: Scheduler, socket_path: str) -> None:
+        self._buffer = buffer
+        self._scheduler = scheduler
+        self._socket_path = socket_path
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self._methods: dict[str, Callable[[dict, Any, asyncio.StreamWriter], Awaitable[Any]]] = {
+            "info": self._info,
+            "read": self._read,
+            "edit": self._edit,
+            "search": self._search,
+            "highlight": self._highlight,
+            "save": self._save,
+        }
+
+    #Starts listening on the socket, returns an error message if it couldn't be opened.
+    def start(self) -> Optional[str]:
+        try:
+            server_socket = self._bind()
+        except OSError as error:
+            return f"The control socket could not be opened: {error.strerror}"
+
+        self._loop = asyncio.new_event_loop()
+        #A daemon thread doesn't keep the editor running when it's closed.
+        Thread(target = self._run, args = (server_socket,), daemon = True).start()
+
+        return None
+
+    #Stops the server and removes the socket.
+    def close(self) -> None:
+        if self._loop != None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+
+        if os.path.exists(self._socket_path):
+            os.remove(self._socket_path)
+
+    #Creates the listening socket. A socket left behind by an editor that didn't close properly is replaced, one that is in use isn't.
+    def _bind(self) -> socket.socket:
+        if os.path.exists(self._socket_path):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                try:
+                    probe.connect(self._socket_path)
+                except OSError:
+                    os.remove(self._socket_path)
+                else:
+                    raise OSError(0, "another editor is using it")
+
+        server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        #Only the user can connect, clients can edit and save the buffer. The socket is created with those permissions, changing them after
+        #binding would let others connect in between.
+        umask = os.umask(0o177)
+
+        try:
+            server_socket.bind(self._socket_path)
+            server_socket.listen()
+        except OSError:
+            server_socket.close()
+            raise
+        finally:
+            os.umask(umask)
+
+        return server_socket
+
+    def _run(self, server_socket: socket.socket) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(asyncio.start_unix_server(self._handle_client, sock = server_socket, limit = MAX_REQUEST_LENGTH))
+        self._loop.run_forever()
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while line := await reader.readline():
+                response = await self._handle_line(line, writer)
+
+                if response != None:
+                    await self._send(writer, response)
+        #The client disconnected or sent a line that is too long.
+        except (ConnectionError, ValueError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    #Handles a single request, returns the response, or "None" for notifications, which get no response.
+    async def _handle_line(self, line: bytes, writer: asyncio.StreamWriter) -> Optional[dict]:
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return self._error_response(None, RpcError(PARSE_ERROR, "Parse error"))
+
+        request_id = request.get("id") if isinstance(request, dict) else None
+        #Requests without an id are notifications.
+        is_notification = isinstance(request, dict) and "id" not in request
+
+        try:
+            if not isinstance(request, dict) or request.get("jsonrpc") != "2.0" or not isinstance(request.get("method"), str):
+                raise RpcError(INVALID_REQUEST, "Invalid request")
+            if request["method"] not in self._methods:
+                raise RpcError(METHOD_NOT_FOUND, f"Unknown method \"{request['method']}\"")
+
+            params = request.get("params", {})
+
+            if not isinstance(params, dict):
+                raise RpcError(INVALID_PARAMS, "The params must be an object")
+
+            result = await self._methods[request["method"]](params, request_id, writer)
+        except RpcError as error:
+            return None if is_notification else self._error_response(request_id, error)
+        except Exception as error:
+            return None if is_notification else self._error_response(request_id, RpcError(SERVER_ERROR, str(error)))
+
+        return None if is_notification else {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+    def _error_response(self, request_id: Any, error: RpcError) -> dict:
+        return {"jsonrpc": "2.0", "id": request_id, "error": {"code": error.code, "message": error.message}}
+
+    async def _send(self, writer: asyncio.StreamWriter, message: dict) -> None:
+        writer.write(json.dumps(message).encode("utf-8") + b"\n")
+        #Waits while the client is slow to read, so a large read doesn't pile up in memory.
+        await writer.drain()
+
+    #Runs the callback on the main loop, between frames, and returns its result. Errors raised by the callback are raised here.
+    def _run_on_main(self, callback: Callable[[], Any]) -> Awaitable[Any]:
+        future = Future()
+
+        def run() -> None:
+            try:
+                future.set_result(callback())
+            except Exception as error:
+                future.set_exception(error)
+
+        self._scheduler.schedule(0, run)
+
+        return asyncio.wrap_future(future)
+
+#################
+#Methods
+#################
+
+    async def _info(self, params: dict, request_id: Any, writer: asyncio.StreamWriter) -> dict:
+        def info() -> dict:
+            cursor_pos = self._buffer.get_cursor_pos()
+
+            return {"filename": self._buffer.get_filename(), "line_count": self._buffer.get_length(), "dirty": self._buffer.get_dirty(),
+                "cursor": {"line": cursor_pos.y, "character": cursor_pos.x}}
+
+        return await self._run_on_main(info)
+
+    async def _read(self, params: dict, request_id: Any, writer: asyncio.StreamWriter) -> dict:
+        start = _get_int(params, "start", 0)
+        end = _get_int(params, "end", None)
+        lines = await self._run_on_main(lambda: self._buffer.get_lines(start, self._buffer.get_length() if end == None else end))
+
+        for offset in range(0, len(lines), READ_CHUNK_LINES):
+            await self._send(writer, {"jsonrpc": "2.0", "method": "read.chunk",
+                "params": {"id": request_id, "start": start + offset, "lines": lines[offset:offset + READ_CHUNK_LINES]}})
+
+        return {"start": start, "line_count": len(lines)}
+
+    async def _edit(self, params: dict, request_id: Any, writer: asyncio.StreamWriter) -> dict:
+        edits = params.get("edits")
+
+        if not isinstance(edits, list):
+            raise RpcError(INVALID_PARAMS, "\"edits\" must be a list")
+
+        ranges = []
+
+        for edit in edits:
+            if not isinstance(edit, dict) or not isinstance(edit.get("text"), str):
+                raise RpcError(INVALID_PARAMS, "Each edit must have a \"start\", an \"end\" and a \"text\"")
+
+            ranges.append((_get_point(edit, "start"), _get_point(edit, "end"), edit["text"]))
+
+        if not await self._run_on_main(lambda: self._buffer.replace_ranges(ranges)):
+            raise RpcError(INVALID_PARAMS, "The ranges are outside of the buffer or overlap")
+
+        return {"applied": len(ranges)}
+
+    async def _search(self, params: dict, request_id: Any, writer: asyncio.StreamWriter) -> list[dict]:
+        regex = params.get("regex")
+
+        if not isinstance(regex, str):
+            raise RpcError(INVALID_PARAMS, "\"regex\" must be a string")
+
+        matches = await self._run_on_main(lambda: self._buffer.find_regex(regex, MAX_SEARCH_MATCHES))
+
+        if matches == None:
+            raise RpcError(INVALID_PARAMS, "Invalid regex")
+
+        return [{"line": line, "start": start, "end": end} for (line, start, end) in matches]
+
+    async def _highlight(self, params: dict, request_id: Any, writer: asyncio.StreamWriter) -> dict:
+        ranges = params.get("ranges", [])
+
+        if not isinstance(ranges, list):
+            raise RpcError(INVALID_PARAMS, "\"ranges\" must be a list")
+
+        ranges = [(_get_int(highlight, "line"), _get_int(highlight, "start"), _get_int(highlight, "end")) for highlight in ranges]
+
+        def highlight() -> None:
+            #Every range is checked before highlighting anything.
+            for (line, start, end) in ranges:
+                if line >= self._buffer.get_length() or start < 0 or start > end or end > len(self._buffer.get_line(line).data):
+                    raise RpcError(INVALID_PARAMS, f"The range {start}-{end} is outside of line {line}")
+
+            if params.get("clear", False):
+                self._buffer.clear_highlight()
+
+            for (line, start, end) in ranges:
+                self._buffer.set_highlight(line, start, end)
+
+        await self._run_on_main(highlight)
+
+        return {"highlighted": len(ranges)}
+
+    async def _save(self, params: dict, request_id: Any, writer: asyncio.StreamWriter) -> str:
+        message = await self._run_on_main(self._buffer.save_file)
+
+        if message == None:
+            raise RpcError(SERVER_ERROR, "The buffer has no file")
+
+        return message
+
+
+#Returns the integer parameter, or "default" if it's missing. Parameters without a default are required.
+def _get_int(params: Any, name: str, default: Optional[int] = ...) -> Optional[int]:
+    if not isinstance(params, dict):
+        raise RpcError(INVALID_PARAMS, "Expected an object")
+    if name not in params and default is not ...:
+        return default
+
+    value = params.get(name)
+
+    #Booleans are integers in Python, but not in JSON.
+    if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+        raise RpcError(INVALID_PARAMS, f"\"{name}\" must be a non-negative integer")
+
+    return value
+
+
+def _get_point(params: dict, name: str) -> Point:
+    position = params.get(name)
+
+    return Point(_get_int(position, "character"), _get_int(position, "line"))
\ No newline at end of file
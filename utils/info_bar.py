@@ -1,26 +1,29 @@
-from dataclasses import dataclass
-from time import time
-from threading import Timer
+from typing import Optional
+
+from utils.scheduler import Scheduler, ScheduledTask
 
 
 class InfoBar:
-    def __init__(self, default_text: str, reset_time: float):
+    def __init__(self, default_text: str, reset_time: float, scheduler: Scheduler):
         self._default_text = default_text
         self._reset_time = reset_time
         self._current_text = self._default_text
-        self.timer = Timer(self._reset_time, self._reset_current_text)
+        self._scheduler = scheduler
+        self._reset_task: Optional[ScheduledTask] = None
 
     def get_current_text(self) -> str:
         return self._current_text
 
     def set_current_text(self, new_text: str) -> None:
-        #Cancel the previous timer in case it was already active.
-        self.timer.cancel()
+        #Cancel the previous reset in case it was still pending.
+        if self._reset_task is not None:
+            self._reset_task.cancel()
 
         self._current_text = new_text
-        #It's necessary to create a new time since timers can only be started once.
-        self.timer = Timer(self._reset_time, self._reset_current_text)
-        self.timer.start()
+        #The reset is run by the main loop, so the text is never changed from another thread.
+        self._reset_task = self._scheduler.schedule(self._reset_time, self._reset_current_text)
+        self._scheduler.wake()
 
     def _reset_current_text(self) -> None:
-        self._current_text = self._default_text
\ No newline at end of file
+        self._current_text = self._default_text
+        self._reset_task = None
\ No newline at end of file
@@ -1,6 +1,7 @@
-from dataclasses import dataclass
+from typing import NamedTuple
 
-@dataclass
-class Point:
+#Points are immutable, a named tuple is used since it takes less memory and is faster to create than a dataclass, which matters as they are
+#created on nearly every cursor movement and edit.
+class Point(NamedTuple):
     x: int
     y: int
\ No newline at end of file
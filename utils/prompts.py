@@ -1,34 +1,45 @@
 from asciimatics.screen import Screen
 from asciimatics.event import Event, MouseEvent
-from typing import Optional
+from typing import Callable, Optional
 
 from utils.point import Point
+from utils.scheduler import Scheduler
 
 #Generates an input prompt at the specified with the given parameters. Can either return a string or "None" if the user pressed the escape key.
 class InputPrompt():
-    def __init__(self, screen: Screen, start: Point, width: int, fg: int, bg: int) -> None:
+    def __init__(self, screen: Screen, start: Point, width: int, fg: int, bg: int, scheduler: Optional[Scheduler] = None) -> None:
         self._start = start
         self._width = width
         self._screen = screen
         self._fg = fg
         self._bg = bg
+        #If given, scheduled tasks keep running while the prompt is waiting for input.
+        self._scheduler = scheduler
 
         self._inp = ""
         self._cursor_pos = 0
 
-    #Function to be called to get input from the prompt.
-    def get_input(self, prompt: str) -> Optional[str]:
+    #Function to be called to get input from the prompt. If "on_change" is given it's called with the current input every time it changes.
+    def get_input(self, prompt: str, on_change: Optional[Callable[[str], None]] = None) -> Optional[str]:
         self._prompt = prompt
         self._inp = ""
         self._cursor_pos = 0
 
         while True:
+            #Tasks are run before displaying the prompt, that way anything they draw ends up beneath it.
+            if self._scheduler != None:
+                self._scheduler.run_pending()
+
             self._display_input()
 
             event = self._screen.get_event()
             #Check if a valid event has occurred.
             if event == None or isinstance(event, MouseEvent):
+                if self._scheduler != None:
+                    self._screen.wait_for_input(self._scheduler.get_idle_wait())
                 continue
+
+            previous_inp = self._inp
             if event.key_code >= 32 and event.key_code <= 254:
                 self._inp = f"{self._inp[:self._cursor_pos]}{chr(event.key_code)}{self._inp[self._cursor_pos:]}"
                 self._cursor_pos += 1
@@ -49,6 +60,10 @@ class InputPrompt():
                 self._cursor_pos = 0
             elif event.key_code == Screen.KEY_END:
                 self._cursor_pos = len(self._inp) - 1
+
+            if on_change != None and self._inp != previous_inp:
+                on_change(self._inp)
+
             if event.key_code == 13:
                 if self._inp != "":
                     return self._inp
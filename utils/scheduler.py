@@ -0,0 +1,110 @@
+from dataclasses import dataclass, field
+from heapq import heappush, heappop
+from itertools import count
+from threading import Lock
+from time import monotonic
+from typing import Callable, Optional
+
+
+#Maximum amount of seconds a loop waits for input before checking the scheduler again, it bounds how long a redraw requested from another
+#thread can be delayed.
+MAX_IDLE_WAIT = 0.05
+
+#A handle for a task in the scheduler, it's returned when scheduling so the task can later be cancelled. Cancelled tasks are left in the heap
+#and skipped when they come up, this avoids having to search the heap to remove them.
+@dataclass
+class ScheduledTask:
+    callback: Callable[[], None]
+    #If set the task is rescheduled with this interval after each run.
+    interval: Optional[float] = None
+    cancelled: bool = field(default = False, compare = False)
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+
+#A single timer heap for all delayed UI work. Nothing runs on its own thread, the main loop calls "run_pending" between frames and uses
+#"get_timeout" to know how long it can wait for input. Scheduling and waking can be done from any thread, callbacks always run on the thread
+#driving the loop, so they can safely modify the editor's state.
+class Scheduler:
+    def __init__(self) -> None:
+        #Heap of (due time, sequence number, task). The sequence number keeps the ordering stable for tasks due at the same time.
+        self._heap: list[tuple[float, int, ScheduledTask]] = []
+        self._sequence = count()
+        self._lock = Lock()
+        #Whether the screen has to be redrawn, starts set so that the first frame is always drawn.
+        self._redraw = True
+
+    #Schedules "callback" to be run once after "delay" seconds.
+    def schedule(self, delay: float, callback: Callable[[], None]) -> ScheduledTask:
+        task = ScheduledTask(callback)
+        self._push(monotonic() + delay, task)
+
+        return task
+
+    #Schedules "callback" to be run every "interval" seconds, until cancelled.
+    def schedule_repeating(self, interval: float, callback: Callable[[], None]) -> ScheduledTask:
+        task = ScheduledTask(callback, interval)
+        self._push(monotonic() + interval, task)
+
+        return task
+
+    #Runs every task that is due, returns whether any task was run. Running a task always requests a redraw, since tasks exist to change
+    #what's on screen.
+    def run_pending(self) -> bool:
+        ran_task = False
+        now = monotonic()
+
+        while True:
+            with self._lock:
+                if not self._heap or self._heap[0][0] > now:
+                    break
+                (_, _, task) = heappop(self._heap)
+
+            if task.cancelled:
+                continue
+
+            task.callback()
+            ran_task = True
+
+            #Repeating tasks are rescheduled relative to the current time, that way a slow frame doesn't cause a burst of runs.
+            if task.interval is not None and not task.cancelled:
+                self._push(now + task.interval, task)
+
+        if ran_task:
+            self.wake()
+
+        return ran_task
+
+    #Returns how many seconds the main loop can wait before a task is due, or "None" if there are no tasks.
+    def get_timeout(self) -> Optional[float]:
+        with self._lock:
+            #Drop cancelled tasks from the top of the heap, so they don't cause needless wake ups.
+            while self._heap and self._heap[0][2].cancelled:
+                heappop(self._heap)
+
+            if not self._heap:
+                return None
+
+            return max(self._heap[0][0] - monotonic(), 0)
+
+    #Returns how many seconds a loop can wait for input before it has to run the scheduler again.
+    def get_idle_wait(self) -> float:
+        timeout = self.get_timeout()
+
+        return MAX_IDLE_WAIT if timeout is None else min(timeout, MAX_IDLE_WAIT)
+
+    #Requests the screen to be redrawn, safe to call from any thread.
+    def wake(self) -> None:
+        self._redraw = True
+
+    #Returns whether a redraw was requested and clears the request.
+    def consume_redraw(self) -> bool:
+        redraw = self._redraw
+        self._redraw = False
+
+        return redraw
+
+    def _push(self, due: float, task: ScheduledTask) -> None:
+        with self._lock:
+            heappush(self._heap, (due, next(self._sequence), task))
\ No newline at end of file
@@ -0,0 +1,54 @@
+from dataclasses import dataclass
+import marshal
+import os
+import os.path
+from typing import Optional
+
+from utils.point import Point
+
+
+#The session is stored in the user's home directory, it's shared by every directory the editor is started from.
+SESSION_FILE = os.path.join(os.path.expanduser("~"), ".console_editor_session")
+#Changing what is stored in the session requires increasing the version, so old sessions are ignored.
+SESSION_VERSION = 1
+
+
+#What's needed to bring the editor back to where it was, the file that was open, the cursor and the scroll.
+@dataclass
+class Session:
+    filename: str
+    cursor: Point
+    x_scroll: int
+    y_scroll: int
+
+
+#Returns the stored session, or "None" if there isn't one or it's not valid.
+def load_session(session_file: str = SESSION_FILE) -> Optional[Session]:
+    try:
+        with open(session_file, "rb") as file:
+            snapshot = marshal.load(file)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+    #The snapshot is a flat tuple, the version followed by the fields of the session.
+    if not isinstance(snapshot, tuple) or len(snapshot) != 6 or snapshot[0] != SESSION_VERSION or not isinstance(snapshot[1], str) or \
+        not all(isinstance(value, int) and value >= 0 for value in snapshot[2:]):
+        return None
+
+    (_, filename, cursor_x, cursor_y, x_scroll, y_scroll) = snapshot
+
+    return Session(filename, Point(cursor_x, cursor_y), x_scroll, y_scroll)
+
+
+#Stores the session, it's not an error if it can't be stored.
+def save_session(session: Session, session_file: str = SESSION_FILE) -> None:
+    temporary_file = f"{session_file}.{os.getpid()}.tmp"
+
+    try:
+        with open(temporary_file, "wb") as file:
+            marshal.dump((SESSION_VERSION, session.filename, session.cursor.x, session.cursor.y, session.x_scroll, session.y_scroll), file)
+
+        os.replace(temporary_file, session_file)
+    except OSError:
+        if os.path.exists(temporary_file):
+            os.remove(temporary_file)
\ No newline at end of file